@@ -0,0 +1,511 @@
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import sys
+import time
+import timeit
+import numpy as np
+import convergence
+import tsp
+import util
+import distance
+import candidates
+import local_search as ls
+import metaheuristics
+import parallel
+import stats
+from params import Params
+try:
+    import resource  # peak RSS (not available on Windows)
+except ImportError:
+    resource = None
+
+
+TIME_FLOOR = 0.05  # secs: time differences below it are not flagged by compare (timer noise)
+
+# best known (optimal) solution costs of the instances in datasets/ (TSPLIB95)
+BKS = {"burma14": 3323, "att48": 10628, "ch130": 6110, "kroA150": 26524, "a280": 2579, "ali535": 202339,
+       "gr666": 294358, "rat783": 8806, "pcb1173": 56892, "fl1577": 22249, "fl3795": 28772}
+
+
+# constructive methods compared by `bench.py constructive` (f(d, coord, cand) -> s, fs, t)
+CONSTRUCTIVES = {
+    "GREEDY": lambda d, coord, cand: tsp.greedy_build(d, cand),
+    "PARTGREEDY": lambda d, coord, cand: tsp.part_greedy_build(d, 0.0, cand),
+    "INSERTION": lambda d, coord, cand: tsp.insertion_build(d, "CHEAPEST"),
+    "NEARINSERTION": lambda d, coord, cand: tsp.insertion_build(d, "NEAREST"),
+    "FARINSERTION": lambda d, coord, cand: tsp.insertion_build(d, "FARTHEST"),
+    "GREEDYEDGE": lambda d, coord, cand: tsp.greedy_edge_build(d, cand),
+    "HILBERT": lambda d, coord, cand: tsp.space_filling_curve_build(d, coord),
+    "MST": lambda d, coord, cand: tsp.mst_build(d),
+}
+
+# algorithms run by `bench.py suite` (f(d, s, fs, params) -> s, fs, t, chart_data); LS is a single local search
+ALGORITHMS = {
+    "LS": lambda d, s, fs, params: local_search_run(d, s, fs, params),
+    "GRASP": lambda d, s, fs, params: metaheuristics.grasp(d, params),
+    "TS": metaheuristics.tabu_search,
+    "SA": metaheuristics.simulated_annealing,
+    "VNS": metaheuristics.vns,
+    "ILS": metaheuristics.ils,
+}
+
+
+def random_instance(n, seed=0):
+    """"Distance matrix and coordinates of n cities drawn uniformly in a 10000 x 10000 square"""
+    xy = np.random.default_rng(seed).uniform(0, 10000, size=(n, 2)).round()
+    return distance.matrix(xy), [(i + 1, x, y) for i, (x, y) in enumerate(xy.tolist())]
+
+
+def strip_tour(coord):
+    """"Closed tour visiting sqrt(n / 2) vertical strips in turn, up and down (short edges, as a constructed tour)"""
+    xy = distance.coord_array(coord)
+    strips = max(1, int((len(xy) / 2) ** 0.5))
+    x = xy[:, 0] - xy[:, 0].min()
+    k = np.minimum((x / max(x.max(), 1e-9) * strips).astype(int), strips - 1)
+    s = np.lexsort((np.where(k % 2, -xy[:, 1], xy[:, 1]), k)).tolist()
+    return s + [s[0]]
+
+
+def timed(f, repeat):
+    """"Median wall time (secs) of repeat calls of f"""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t)
+    return float(np.median(times))
+
+
+def crossover(sizes, workers, repeat=3):
+    """"Time of one best-improvement scan of the 2-opt neighborhood (full, NumPy) and of the candidate 3-opt
+    neighborhood, serial vs split among the processes of a parallel.NeighborhoodPool, on random instances of the
+    given sizes; prints the instance size from which the pool pays off"""
+    print(f'{"n":>7} | {"2-opt serial":>12} {"parallel":>10} {"speedup":>8} | {"3-opt serial":>12} {"parallel":>10} '
+          f'{"speedup":>8}')
+    speedups = {"2-opt": [], "3-opt": []}
+    for n in sizes:
+        d, coord = random_instance(n)
+        cand = candidates.knn(d, coord, candidates.K)
+        s = tsp.Tour(strip_tour(coord))
+        fs = tsp.full_eval(d, s)
+        pool = parallel.NeighborhoodPool(d, workers, cand)
+        try:
+            pool.best_two_opt_move(s, fs)  # warm up the workers
+            t2 = timed(lambda: ls.best_two_opt_move(d, s, fs), repeat)
+            p2 = timed(lambda: pool.best_two_opt_move(s, fs), repeat)
+            t3 = timed(lambda: ls.best_three_opt_candidate_move(d, s, fs, cand), repeat)
+            p3 = timed(lambda: pool.best_three_opt_move(s, fs), repeat)
+        finally:
+            pool.close()
+        speedups["2-opt"].append(t2 / p2)
+        speedups["3-opt"].append(t3 / p3)
+        print(f'{n:7d} | {t2 * 1000:10.2f}ms {p2 * 1000:8.2f}ms {t2 / p2:7.2f}x | {t3 * 1000:10.2f}ms {p3 * 1000:8.2f}ms '
+              f'{t3 / p3:7.2f}x')
+    for name, values in speedups.items():
+        # smallest size from which every larger size is faster in parallel
+        pays = [n for k, n in enumerate(sizes) if all(v > 1 for v in values[k:])]
+        print(f'{name}: ' + (f'{workers} processes pay off from n = {pays[0]}' if pays else
+                             f'{workers} processes do not pay off up to n = {sizes[-1]}'))
+
+
+def constructive(instances, localsearch, repeat=3):
+    """"Build time and cost of each constructive method on the given instances, and time and cost of the local search
+    (ls.local_search with the given -localsearch) started from the built tour; the total time saved (or lost, < 0)
+    is relative to the nearest neighbor build (GREEDY)"""
+    print(f'{"instance":>12} {"constructive":>12} | {"build":>10} {"cost":>12} | {"local search":>12} {"cost":>12} | '
+          f'{"saved":>9}')
+    for path in instances:
+        d, coord = util.read_tsp(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            params = Params(["main.py", path, "-localsearch", localsearch])
+        params.cand = candidates.knn(d, coord, candidates.K)
+        name = os.path.splitext(os.path.basename(path))[0]
+        total_ref = None
+        for method, build in CONSTRUCTIVES.items():
+            if method == "HILBERT" and len(coord) != len(d):
+                continue  # no coordinates (EXPLICIT instance)
+            t_build = timed(lambda: build(d, coord, params.cand), repeat)
+            s, fs, _ = build(d, coord, params.cand)
+            t = time.perf_counter()
+            s_, fs_, _ = ls.local_search(d, tsp.new_tour(s, params.tour_repr), fs, params)
+            t_ls = time.perf_counter() - t
+            if total_ref is None:
+                total_ref = t_build + t_ls
+            print(f'{name:>12} {method:>12} | {t_build * 1000:8.1f}ms {fs:12.1f} | {t_ls:11.2f}s {fs_:12.1f} | '
+                  f'{total_ref - t_build - t_ls:8.2f}s')
+
+
+def local_search_run(d, s, fs, params):
+    """"A single ls.local_search from s, with a trace as returned by the metaheuristics"""
+    t_init = time.time()
+    trace = convergence.new_trace(params)
+    trace.add(0.0, fs, fs)
+    s_, fs_, t = ls.local_search(d, tsp.new_tour(s, params.tour_repr), fs, params)
+    trace.add(time.time() - t_init, fs_, min(fs, fs_))
+    return s_, fs_, time.time() - t_init, trace.close()
+
+
+def peak_rss_mb():
+    """"Peak resident set size (MB) of the current process (None where unavailable)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10  # bytes on macOS, KB on Linux
+
+
+def gap(cost, bks):
+    """"Gap (%) of cost to the best known solution cost (None if unknown)"""
+    return None if bks is None else 100 * (cost - bks) / bks
+
+
+def run_config(config):
+    """"One run of the suite (in a fresh process, so peak RSS is its own): read the instance, build the initial
+    solution, run the algorithm and measure it (the moves it evaluates are counted by stats, so every run pays the
+    same instrumentation overhead)"""
+    path, constructive, localsearch, algorithm, seed, timelimit, target = config
+    t_init = time.perf_counter()
+    name = os.path.splitext(os.path.basename(path))[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        params = Params(["main.py", path, "-localsearch", localsearch, "-algorithm", algorithm, "-seed", str(seed),
+                         "-timelimit", str(timelimit), "-verbose", "0"])
+        random.seed(seed)
+        d, coord = util.read_tsp(path)
+        params.cand = candidates.knn(d, coord, params.candidates or candidates.K)
+        s, fs_ini, t_build = CONSTRUCTIVES[constructive](d, coord, params.cand)
+        stats.enable()
+        s, fs, t, data = ALGORITHMS[algorithm](d, s, fs_ini, params)
+        evaluated = stats.evaluations()
+        stats.disable()
+    wall = time.perf_counter() - t_init
+    fs = tsp.full_eval(d, tsp.tour_list(s))  # checked cost of the returned tour
+    bks = BKS.get(name)
+    data = np.asarray(data)
+    hits = data[data[:, 2] <= bks * (1 + target / 100), 0] if bks is not None else []
+    return {"instance": name, "n": len(d), "constructive": constructive, "localsearch": localsearch,
+            "algorithm": algorithm, "seed": seed, "bks": bks, "build_time": t_build, "initial_cost": fs_ini,
+            "cost": fs, "gap": gap(fs, bks), "wall_time": wall, "time_to_target": float(hits[0]) if len(hits) else None,
+            "moves_evaluated": evaluated, "moves_evaluated_per_s": evaluated / max(t, 1e-9),
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def suite(instances, constructives, localsearches, algorithms, seeds, timelimit, target, output):
+    """"Run every combination of instances, constructives, local searches, algorithms and seeds, each one in a
+    fresh process, and write the measures of each run to the JSON file output
+    Measures: wall time (secs, reading the instance included), time to target (secs until the best cost is within
+    target % of the BKS, None if never), moves evaluated per second (all neighborhoods), peak RSS (MB)
+    and gap (%) to the BKS"""
+    configs = list(itertools.product(instances, constructives, localsearches, algorithms, seeds))
+    print(f'{"instance":>10} {"constr.":>10} {"ls":>8} {"alg":>5} {"seed":>4} | {"cost":>12} {"gap":>7} | '
+          f'{"wall":>8} {"target":>8} {"moves/s":>9} {"rss":>7}')
+    runs = []
+    with mp.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for r in pool.imap(run_config, [c + (timelimit, target) for c in configs]):
+            runs.append(r)
+            print(f'{r["instance"]:>10} {r["constructive"][:10]:>10} {r["localsearch"]:>8} {r["algorithm"]:>5} '
+                  f'{r["seed"]:4d} | {r["cost"]:12.1f} {fmt(r["gap"], "6.2f", "%")} | {r["wall_time"]:7.2f}s '
+                  f'{fmt(r["time_to_target"], "7.2f", "s")} {r["moves_evaluated_per_s"]:9.0f} {fmt(r["peak_rss_mb"], "5.0f", "MB")}')
+    meta = {"date": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "timelimit": timelimit, "target": target}
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "runs": runs}, f, indent=1)
+    print(f'{len(runs)} runs written to {output}')
+    return runs
+
+
+def fmt(v, spec, unit=""):
+    """"Formatted value followed by its unit, or - if None"""
+    return format(v, spec) + unit if v is not None else "-".rjust(int(spec.split(".")[0]) + len(unit))
+
+
+def summary(runs):
+    """"Mean measures of the runs of each (instance, constructive, local search, algorithm) over the seeds"""
+    groups = {}
+    for r in runs:
+        groups.setdefault((r["instance"], r["constructive"], r["localsearch"], r["algorithm"]), []).append(r)
+    means = {}
+    for key, group in groups.items():
+        means[key] = {}
+        for m in ("gap", "wall_time", "time_to_target", "moves_evaluated_per_s"):
+            values = [r.get(m) for r in group]  # None if missing (outputs of older versions)
+            # a run missing the target counts as never reaching it
+            means[key][m] = None if any(v is None for v in values) else float(np.mean(values))
+    return means
+
+
+def compare(baseline, results, tolerance=10.0, gap_tolerance=0.5):
+    """"Compare the runs of two suite outputs (JSON files) grouped over the seeds and flag regressions: a gap
+    larger by more than gap_tolerance points, or a wall time or time to target (LS runs: wall time only) longer, or
+    fewer moves evaluated per second (not for LS runs, too short), by more than tolerance % (and TIME_FLOOR);
+    returns the number of regressions"""
+    with open(baseline) as f:
+        old = summary(json.load(f)["runs"])
+    with open(results) as f:
+        new = summary(json.load(f)["runs"])
+    print(f'{"instance":>10} {"constr.":>10} {"ls":>8} {"alg":>5} | {"gap":>15} | {"time":>17} | '
+          f'{"moves/s":>24} | status')
+    regressions = 0
+    for key in sorted(set(old) & set(new)):
+        o, m = old[key], new[key]
+        time_key = "wall_time" if key[3] == "LS" else "time_to_target"
+        flags = []
+        if o["gap"] is not None and m["gap"] is not None and m["gap"] > o["gap"] + gap_tolerance:
+            flags.append("gap")
+        if o[time_key] is not None and (m[time_key] is None or m[time_key] > max(o[time_key] * (1 + tolerance / 100),
+                                                                                 o[time_key] + TIME_FLOOR)):
+            flags.append("time")
+        rate = "moves_evaluated_per_s"
+        if key[3] != "LS" and None not in (o[rate], m[rate]) and m[rate] < o[rate] * (1 - tolerance / 100):
+            flags.append("moves/s")
+        regressions += len(flags) > 0
+        print(f'{key[0]:>10} {key[1][:10]:>10} {key[2]:>8} {key[3]:>5} | {fmt(o["gap"], "6.2f")} -> '
+              f'{fmt(m["gap"], "6.2f")} | {fmt(o[time_key], "7.2f")} -> {fmt(m[time_key], "7.2f")} | '
+              f'{fmt(o[rate], "10.0f")} -> {fmt(m[rate], "10.0f")} | '
+              + ("REGRESSION (" + ", ".join(flags) + ")" if flags else "ok"))
+    for key in sorted(set(old) ^ set(new)):
+        print(f'{key[0]:>10} {key[1][:10]:>10} {key[2]:>8} {key[3]:>5} | only in {baseline if key in old else results}')
+    print(f'{regressions} regression(s)')
+    return regressions
+
+
+def sample_moves(rng, n, m):
+    """"m random arguments of each kernel on a tour of n cities: 2-opt (i, j), 3-opt (i, j, k), swap (i, j) and
+    Or-opt (i, l, j, rev) indexes as generated by local_search, and 2-opt city pairs (a, c)"""
+    two = [tuple(sorted(rng.choice(np.arange(1, n), 2, replace=False).tolist())) for _ in range(m)]
+    three = [tuple(sorted(rng.choice(n, 3, replace=False).tolist())) for _ in range(m)]
+    swap = [tuple(rng.choice(np.arange(1, n), 2, replace=False).tolist()) for _ in range(m)]
+    orr = []
+    while len(orr) < m:
+        l = int(rng.integers(1, ls.OR_OPT_MAX + 1))
+        i, j = int(rng.integers(1, n - l + 1)), int(rng.integers(0, n))
+        if not i - 1 <= j <= i + l - 1:
+            orr.append((i, l, j, bool(rng.integers(2)) and l > 1))
+    city = [tuple(rng.choice(n, 2, replace=False).tolist()) for _ in range(m)]
+    return {"two": two, "three": three, "swap": swap, "or": orr, "city": city}
+
+
+def edges(s):
+    """"Undirected edge set of a closed tour (tours equal up to rotation and direction have the same one)"""
+    s = tsp.tour_list(s)
+    return {(a, b) if a < b else (b, a) for a, b in zip(s[:-1], s[1:])}
+
+
+def check_kernels(d, o, s, fs, mv, checks):
+    """"Check the kernels against the *_naive reference implementations of tsp.py (and the oracle and NumPy
+    backends against the matrix) on the first checks moves of each kind; returns {kernel: True if all agree}"""
+    same = lambda x, y: abs(x - y) <= 1e-6 * max(1.0, abs(y))
+    ok = {}
+
+    def check(name, agree):
+        ok[name] = ok.get(name, True) and bool(agree)
+
+    a, t = distance.as_array(d), np.array(s)
+    for i, j in mv["two"][:checks]:
+        ref, fs_ref = tsp.two_opt_move_naive(d, list(s), fs, i, j)
+        check("two_opt", same(tsp.two_opt(d, s, fs, i, j), fs_ref) and same(tsp.two_opt(o, s, fs, i, j), fs_ref))
+        check("two_opt_deltas", same(fs + tsp.two_opt_deltas(a, t, i - 1, j), fs_ref) and
+              same(fs + tsp.two_opt_deltas(o, t, np.array([i - 1]), np.array([j]))[0], fs_ref))
+        for tour in (list(s), tsp.Tour(s)):
+            tour, fs_ = tsp.two_opt_move(d, tour, fs, i, j)
+            check("two_opt_move", same(fs_, fs_ref) and edges(tour) == edges(ref))
+    for i, j, k in mv["three"][:checks]:
+        ref, fs_ref = tsp.three_opt_move_naive(d, list(s), fs, i, j, k)
+        check("three_opt", same(tsp.three_opt(d, s, fs, i, j, k), fs_ref) and
+              same(tsp.three_opt(o, s, fs, i, j, k), fs_ref))
+        check("three_opt_deltas", same(fs + tsp.three_opt_deltas(a, t, np.array([i]), np.array([j]), np.array([k]))[0],
+                                       fs_ref))
+        for tour in (list(s), tsp.Tour(s)):
+            tour, fs_ = tsp.three_opt_move(d, tour, fs, i, j, k)
+            check("three_opt_move", same(fs_, fs_ref) and same(tsp.full_eval(d, tour), fs_ref))
+    for i, j in mv["swap"][:checks]:
+        ref, fs_ref = tsp.swap_move_naive(d, list(s), fs, i, j)
+        check("swap", same(tsp.swap(d, list(s), fs, i, j)[1], fs_ref) and same(tsp.swap(o, list(s), fs, i, j)[1], fs_ref))
+        for tour in (list(s), tsp.Tour(s)):
+            tour, fs_ = tsp.swap_move(d, tour, fs, i, j)
+            check("swap_move", same(fs_, fs_ref) and edges(tour) == edges(ref))
+    for i, l, j, rev in mv["or"][:checks]:
+        ref, fs_ref = tsp.or_opt_move_naive(d, list(s), fs, i, l, j, rev)
+        check("or_opt", same(tsp.or_opt(d, s, fs, i, l, j, rev), fs_ref) and
+              same(tsp.or_opt(o, s, fs, i, l, j, rev), fs_ref))
+        for tour in (list(s), tsp.Tour(s)):
+            tour, fs_ = tsp.or_opt_move(d, tour, fs, i, l, j, rev)
+            check("or_opt_move", same(fs_, fs_ref) and edges(tour) == edges(ref))
+    for x, y in mv["city"][:checks]:
+        for tour in (tsp.Tour(s), tsp.TwoLevelList(s)):
+            fs_ref = tsp.two_opt_city(d, tour, fs, x, y)
+            tour, fs_ = tsp.two_opt_city_move(d, tour, fs, x, y)
+            check("two_opt_city_move", same(fs_, fs_ref) and same(tsp.full_eval(d, tsp.tour_list(tour)), fs_ref))
+    check("full_eval", same(tsp.full_eval(o, s), fs) and same(float(a[t[:-1], t[1:]].sum()), fs))
+    return ok
+
+
+def kernels(sizes, moves=1000, checks=100, seed=0):
+    """"Time of each move evaluation and move kernel of tsp.py (ns per call, Python loop included, and calls per
+    second) on random tours of the given sizes with fixed seeds, for each backend: full matrix or distance oracle,
+    NumPy (vectorized deltas of moves batches), list, Tour or TwoLevelList tours; the kernels are first checked
+    against the *_naive reference implementations"""
+    print(f'{"n":>6} {"kernel":>18} {"backend":>13} | {"ns/call":>12} {"calls/s":>12} | check')
+    for n in sizes:
+        d, coord = random_instance(n, seed)
+        o = distance.oracle(distance.coord_array(coord))
+        rng = np.random.default_rng(seed)
+        s = rng.permutation(n).tolist()
+        s.append(s[0])
+        fs = tsp.full_eval(d, s)
+        mv = sample_moves(rng, n, moves)
+        ok = check_kernels(d, o, s, fs, mv, checks)
+        a, t = distance.as_array(d), np.array(s)
+        two, three = np.array(mv["two"]), np.array(mv["three"])
+        tours = {"list": list(s), "Tour": tsp.Tour(s), "TwoLevelList": tsp.TwoLevelList(s)}
+        cases = [("full_eval", "matrix", lambda: tsp.full_eval(d, s), 1),
+                 ("full_eval", "oracle", lambda: tsp.full_eval(o, s), 1),
+                 ("full_eval", "numpy", lambda: a[t[:-1], t[1:]].sum(), 1)]
+        for name, dd in (("matrix", d), ("oracle", o)):
+            cases += [("two_opt", name, lambda dd=dd: [tsp.two_opt(dd, s, fs, i, j) for i, j in mv["two"]], moves),
+                      ("three_opt", name, lambda dd=dd: [tsp.three_opt(dd, s, fs, i, j, k) for i, j, k in mv["three"]],
+                       moves),
+                      ("swap", name, lambda dd=dd: [tsp.swap(dd, s, fs, i, j) for i, j in mv["swap"]], moves),
+                      ("or_opt", name, lambda dd=dd: [tsp.or_opt(dd, s, fs, *m) for m in mv["or"]], moves)]
+        for name, aa in (("numpy", a), ("numpy oracle", o)):
+            cases += [("two_opt_deltas", name, lambda aa=aa: tsp.two_opt_deltas(aa, t, two[:, 0] - 1, two[:, 1]), moves),
+                      ("three_opt_deltas", name, lambda aa=aa: tsp.three_opt_deltas(aa, t, *three.T), moves)]
+        for name in ("list", "Tour"):
+            tour = tours[name]
+            cases += [("two_opt_move", name, lambda s=tour: [tsp.two_opt_move(d, s, fs, i, j) for i, j in mv["two"]],
+                       moves),
+                      ("three_opt_move", name,
+                       lambda s=tour: [tsp.three_opt_move(d, s, fs, i, j, k) for i, j, k in mv["three"]], moves),
+                      ("swap_move", name, lambda s=tour: [tsp.swap_move(d, s, fs, i, j) for i, j in mv["swap"]], moves),
+                      ("or_opt_move", name, lambda s=tour: [tsp.or_opt_move(d, s, fs, *m) for m in mv["or"]], moves)]
+        for name in ("Tour", "TwoLevelList"):
+            cases.append(("two_opt_city_move", name,
+                          lambda s=tours[name]: [tsp.two_opt_city_move(d, s, fs, x, y) for x, y in mv["city"]], moves))
+        for kernel, backend, f, calls in cases:
+            number, total = timeit.Timer(f).autorange()
+            ns = total / (number * calls) * 1e9
+            check = ok.get(kernel)
+            print(f'{n:6d} {kernel:>18} {backend:>13} | {ns:12.1f} {1e9 / ns:12.1f} | '
+                  f'{"-" if check is None else "ok" if check else "FAIL"}')
+
+
+def print_usage():
+    print(f"Usage: python bench.py <benchmark> [params]")
+    print(f"  crossover    : serial vs parallel neighborhood evaluation (-eval_workers) on random instances")
+    print(f"  constructive : build time of the constructive methods and time of the local search started from them")
+    print(f"  suite        : runs of every combination of instances, constructives, local searches, algorithms and")
+    print(f"                 seeds (wall time, time to target, moves evaluated/s, peak RSS and gap to BKS) written to JSON")
+    print(f"  compare <baseline.json> <results.json> : flag the regressions of suite results against a baseline")
+    print(f"                 (exit status 1 if any)")
+    print(f"  kernels      : ns per call of the move evaluation and move kernels of tsp.py (checked against the")
+    print(f"                 *_naive references) on random tours")
+    print(f"")
+    print(f"Parameters:")
+    print(f"  -workers <n>          : number of processes of the pool (default: number of cores).")
+    print(f"  -sizes <list>         : comma separated instance sizes (default: 200,500,1000,2000,4000 in crossover,")
+    print(f"                          100,1000,10000 in kernels).")
+    print(f"  -moves <n>            : random moves timed per kernel call batch in kernels (default: 1000).")
+    print(f"  -checks <n>           : moves of each kind checked against the naive references in kernels (default: 100).")
+    print(f"  -seed <n>             : random seed of the instances, tours and moves of kernels (default: 0).")
+    print(f"  -repeat <n>           : timed repetitions of each scan or build (median reported) (default: 3).")
+    print(f"  -instances <list>     : comma separated instance files (default: a280, pcb1173 and fl3795 in constructive,")
+    print(f"                          all of datasets/ from burma14 to fl3795 in suite).")
+    print(f"  -localsearch <value>  : local search run after each constructive (see main.py) (default: LK).")
+    print(f"  -constructives <list> : comma separated constructives of suite among {{GREEDY, PARTGREEDY, INSERTION,")
+    print(f"                          NEARINSERTION, FARINSERTION, GREEDYEDGE, HILBERT, MST}} (default: GREEDY).")
+    print(f"  -localsearches <list> : comma separated local searches of suite (see main.py) (default: DLB2).")
+    print(f"  -algorithms <list>    : comma separated algorithms of suite among {{LS, GRASP, TS, SA, VNS, ILS}}")
+    print(f"                          (LS = a single local search) (default: ILS).")
+    print(f"  -seeds <list>         : comma separated random seeds of suite (default: 1,2,3).")
+    print(f"  -timelimit <secs>     : time limit of each suite run (default: 10).")
+    print(f"  -target <value>       : gap (%) to the BKS defining the time to target (default: 5.0).")
+    print(f"  -output <file>        : JSON file written by suite (default: bench.json).")
+    print(f"  -tolerance <value>    : relative slowdown (%) of compare flagged as a regression (default: 10.0).")
+    print(f"  -gap_tolerance <v>    : increase of the gap (% points) of compare flagged as a regression (default: 0.5).")
+
+
+def main(args):
+    if len(args) < 2 or args[1] not in ("crossover", "constructive", "suite", "compare", "kernels") or \
+            (args[1] == "compare" and len(args) < 4):
+        print_usage()
+        return
+    workers = os.cpu_count() or 1
+    sizes = None
+    repeat = 3
+    moves = 1000
+    checks = 100
+    seed = 0
+    instances = None
+    localsearch = "LK"
+    constructives = ["GREEDY"]
+    localsearches = ["DLB2"]
+    algorithms = ["ILS"]
+    seeds = [1, 2, 3]
+    timelimit = 10
+    target = 5.0
+    output = "bench.json"
+    tolerance = 10.0
+    gap_tolerance = 0.5
+    i = 4 if args[1] == "compare" else 2
+    while i < len(args) - 1:
+        if args[i] == "-workers":
+            workers = int(args[i + 1])
+        elif args[i] == "-sizes":
+            sizes = [int(v) for v in args[i + 1].split(",")]
+        elif args[i] == "-repeat":
+            repeat = int(args[i + 1])
+        elif args[i] == "-instances":
+            instances = args[i + 1].split(",")
+        elif args[i] == "-localsearch":
+            localsearch = args[i + 1]
+        elif args[i] == "-constructives":
+            constructives = args[i + 1].split(",")
+        elif args[i] == "-localsearches":
+            localsearches = args[i + 1].split(",")
+        elif args[i] == "-algorithms":
+            algorithms = args[i + 1].split(",")
+        elif args[i] == "-seeds":
+            seeds = [int(v) for v in args[i + 1].split(",")]
+        elif args[i] == "-timelimit":
+            timelimit = int(args[i + 1])
+        elif args[i] == "-target":
+            target = float(args[i + 1])
+        elif args[i] == "-output":
+            output = args[i + 1]
+        elif args[i] == "-tolerance":
+            tolerance = float(args[i + 1])
+        elif args[i] == "-gap_tolerance":
+            gap_tolerance = float(args[i + 1])
+        elif args[i] == "-moves":
+            moves = int(args[i + 1])
+        elif args[i] == "-checks":
+            checks = int(args[i + 1])
+        elif args[i] == "-seed":
+            seed = int(args[i + 1])
+        else:
+            print(f'\nWARNING: Unrecognized argument {args[i]}')
+        i += 2
+    if args[1] == "crossover":
+        crossover(sizes or [200, 500, 1000, 2000, 4000], workers, repeat)
+    elif args[1] == "kernels":
+        kernels(sizes or [100, 1000, 10000], moves, checks, seed)
+    elif args[1] == "constructive":
+        constructive(instances or ["datasets/a280.tsp", "datasets/pcb1173.tsp", "datasets/fl3795.tsp"], localsearch,
+                     repeat)
+    elif args[1] == "suite":
+        instances = instances or [f'datasets/{name}.tsp' for name in BKS]
+        unknown = [v for v in constructives if v not in CONSTRUCTIVES] + [v for v in algorithms if v not in ALGORITHMS]
+        if unknown:
+            print(f'ERROR: Unknown constructives or algorithms {unknown}')
+            return
+        suite(instances, constructives, localsearches, algorithms, seeds, timelimit, target, output)
+    elif compare(args[2], args[3], tolerance, gap_tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
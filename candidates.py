@@ -0,0 +1,76 @@
+import math
+import numpy as np
+import distance
+
+
+K = 10  # default candidate list size when a method needs candidate lists and -candidates is 0
+
+
+def knn(d, coord, k):
+    """"Candidate lists: the k nearest cities of each city, sorted by distance
+    A full distance matrix is scanned row by row (exact, vectorized); a distance oracle is
+    queried through a uniform grid built from the coordinates (O(n log n) instead of O(n^2))"""
+    n = len(d)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    if isinstance(d, distance.Oracle) and len(coord) == n:
+        return grid_knn(d, distance.coord_array(coord), k)
+    return matrix_knn(distance.as_array(d), k)
+
+
+def matrix_knn(a, k, block=1 << 20):
+    """"k nearest cities of each city by partial sort of the rows of the distance matrix"""
+    n = len(a)
+    cand = []
+    step = max(1, block // n)
+    for r0 in range(0, n, step):
+        rows = np.array(a[r0:r0 + step], dtype=np.float64)
+        rows[np.arange(len(rows)), np.arange(r0, r0 + len(rows))] = np.inf  # a city is not its own candidate
+        idx = np.argpartition(rows, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(rows, idx, axis=1), axis=1, kind="stable")
+        cand.extend(np.take_along_axis(idx, order, axis=1).tolist())
+    return cand
+
+
+def grid_knn(d, xy, k):
+    """"k nearest cities of each city using a uniform grid of about 2 cities per cell
+    Cells are visited in growing rings until the ring is farther than the k-th closest city found
+    (exact for Euclidean-like metrics, a close approximation for GEO)"""
+    n = len(xy)
+    lo = xy.min(axis=0)
+    side = max(1, int(math.sqrt(n / 2)))
+    size = np.maximum((xy.max(axis=0) - lo) / side, 1e-9)
+    cx = np.minimum(((xy[:, 0] - lo[0]) / size[0]).astype(int), side - 1)
+    cy = np.minimum(((xy[:, 1] - lo[1]) / size[1]).astype(int), side - 1)
+    cell = cx * side + cy
+    order = np.argsort(cell, kind="stable")
+    start = np.searchsorted(cell[order], np.arange(side * side + 1))
+    cand = []
+    for c in range(n):
+        x, y = int(cx[c]), int(cy[c])
+        found = []
+        r = 0
+        while True:
+            for gx in range(x - r, x + r + 1):
+                if not 0 <= gx < side:
+                    continue
+                for gy in ((y - r, y + r) if gx not in (x - r, x + r) and r else range(y - r, y + r + 1)):
+                    if 0 <= gy < side:
+                        g = gx * side + gy
+                        found.extend(order[start[g]:start[g + 1]].tolist())
+            if len(found) > k:
+                idx = np.array(found)
+                dx = xy[idx, 0] - xy[c, 0]
+                dy = xy[idx, 1] - xy[c, 1]
+                kth = np.partition(dx * dx + dy * dy, k)[k]  # k+1 points: c itself is among them
+                if r * min(size) >= math.sqrt(kth) or r >= side:
+                    break
+            elif r >= side:
+                break
+            r += 1
+        idx = np.array([j for j in found if j != c])
+        dist = np.asarray(d.dist(c, idx), dtype=np.float64)
+        best = np.argsort(dist, kind="stable")[:k]
+        cand.append(idx[best].tolist())
+    return cand
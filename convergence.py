@@ -0,0 +1,122 @@
+import json
+import os
+import numpy as np
+
+
+SIZE = 10000  # default number of records kept by a Trace
+
+
+class Trace:
+    """"Bounded convergence trace of a search: records [time, fs, fs*] kept in a NumPy buffer preallocated with
+    `size` rows, so memory stays flat however long the run lasts
+    Mode ALL keeps the records improving fs* and one record out of `step`: when the buffer is full every other
+    sampled record is dropped and the step doubles (as the run goes on, samples stay evenly spread over it); mode
+    BEST keeps the records improving fs* only (every other one is dropped when full). The last record is always kept. Every record may
+    also be streamed to a CSV or JSONL file (by its extension). np.asarray(trace) gives the kept records as rows,
+    so a trace is chart data for util.plot_chart and util.plot_overall_chart"""
+
+    def __init__(self, size=SIZE, mode="ALL", file=None):
+        self.buf = np.empty((max(4, size), 3))
+        self.mode = mode
+        self.m = 0          # records kept in buf
+        self.step = 1       # one record out of step is kept (mode ALL)
+        self.seen = 0       # records added
+        self.best = np.inf  # best fs* kept
+        self.last = None    # last record added (kept by array() even if it was not sampled)
+        self.last_kept = False
+        self.file = file
+        self.out = open(file, "w") if file else None
+        self.jsonl = file is not None and file.endswith(".jsonl")
+        if self.out is not None and not self.jsonl:
+            self.out.write("time,fs,fs_star\n")
+
+    def add(self, t, fs, fs_star):
+        """"Record the current cost fs and the best cost fs* at time t (secs)"""
+        self.seen += 1
+        self.last = (t, fs, fs_star)
+        if self.out is not None:
+            if self.jsonl:
+                self.out.write(f'{{"time": {t!r}, "fs": {fs!r}, "fs_star": {fs_star!r}}}\n')
+            else:
+                self.out.write(f'{t!r},{fs!r},{fs_star!r}\n')
+        self.last_kept = fs_star < self.best or (self.mode == "ALL" and self.seen % self.step == 0)
+        if self.last_kept:
+            if fs_star < self.best:
+                self.best = fs_star
+            if self.m == len(self.buf):
+                self.compact()
+            self.buf[self.m] = self.last
+            self.m += 1
+
+    def compact(self):
+        """"Make room in the full buffer: every other record not improving fs* is dropped (every other record if the
+        improvements fill more than half of the buffer, or in mode BEST) and the step grows with the records added"""
+        a = self.buf[:self.m]
+        improving = np.r_[True, a[1:, 2] < a[:-1, 2]]
+        if self.mode == "ALL" and np.count_nonzero(improving) <= len(self.buf) // 2:
+            other = ~improving
+            keep = improving | (other & (np.cumsum(other) % 2 == 0))
+        else:
+            keep = np.zeros(self.m, dtype=bool)
+            keep[::2] = True
+        kept = a[keep]
+        self.m = len(kept)
+        self.buf[:self.m] = kept
+        while self.step * len(self.buf) < 2 * self.seen:  # about half of the buffer for evenly sampled records
+            self.step *= 2
+
+    def array(self):
+        """"Kept records as an m x 3 array (time, fs, fs*), the last record added included"""
+        if self.last is None or self.last_kept:
+            return self.buf[:self.m].copy()
+        return np.vstack((self.buf[:self.m], self.last))
+
+    def close(self):
+        """"Close the stream file (if any); returns the trace"""
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+        return self
+
+    def __array__(self, dtype=None, copy=None):
+        a = self.array()
+        return a if dtype is None else a.astype(dtype)
+
+    def __len__(self):
+        return self.m + (self.last is not None and not self.last_kept)
+
+    def __getstate__(self):  # sent between processes without the stream and the unused rows
+        state = self.__dict__.copy()
+        state["buf"] = self.buf[:self.m].copy()
+        state["size"] = len(self.buf)
+        state["out"] = None
+        return state
+
+    def __setstate__(self, state):
+        size = state.pop("size")
+        buf = state["buf"]
+        state["buf"] = np.empty((size, 3))
+        state["buf"][:len(buf)] = buf
+        self.__dict__.update(state)
+
+
+def new_trace(params):
+    """"Trace of a search as set by the -trace_size, -trace_mode and -trace_file parameters"""
+    return Trace(params.trace_size, params.trace_mode, params.trace_file)
+
+
+def process_file(file):
+    """"Name of the trace file of the current process when several processes trace a search (file.<pid>.ext)"""
+    if not file:
+        return file
+    root, ext = os.path.splitext(file)
+    return f'{root}.{os.getpid()}{ext}'
+
+
+def read(file):
+    """"Records of a streamed trace file (CSV or JSONL) as an m x 3 array (time, fs, fs*)"""
+    if file.endswith(".jsonl"):
+        with open(file) as f:
+            rows = [(r["time"], r["fs"], r["fs_star"]) for r in map(json.loads, f)]
+        return np.array(rows, dtype=np.float64).reshape(-1, 3)
+    return np.loadtxt(file, delimiter=",", skiprows=1, ndmin=2).reshape(-1, 3)
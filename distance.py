@@ -0,0 +1,205 @@
+from collections import OrderedDict
+import numpy as np
+
+
+PI = 3.141592     # TSPLIB95 GEO constants
+RRR = 6378.388
+BLOCK = 1 << 22   # max number of distances computed at once when building a full matrix
+
+
+class Matrix(list):
+    """"Distance matrix stored once as a contiguous NumPy array (attribute `array`)
+    Rows are exposed as memoryviews over the same buffer, so `d[i][j]` keeps the
+    speed of a list of lists (and returns Python floats) without copying the data"""
+
+    def __init__(self, array):
+        self.array = np.ascontiguousarray(array)
+        super().__init__(memoryview(row) for row in self.array)
+
+
+class Oracle:
+    """"Lazy distance oracle with the same d[i][j] interface as a Matrix
+    Rows are computed on demand from the coordinates and the most recently used ones are
+    kept in a bounded LRU cache, so memory stays O(n * cache_rows) instead of O(n^2)"""
+
+    def __init__(self, xy, dtype=np.float64, cache_rows=256, metric="EUC_2D"):
+        self.metric = metric
+        xy = prepare(metric, xy)
+        self.x = np.ascontiguousarray(xy[:, 0])
+        self.y = np.ascontiguousarray(xy[:, 1])
+        self.dtype = np.dtype(dtype)
+        self.cache_rows = max(1, cache_rows)
+        self.cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        if isinstance(i, tuple):  # d[x, y]: element-wise distances (as indexing a NumPy matrix with two arrays)
+            return self.pairs(*i)
+        row = self.cache.get(i)
+        if row is None:
+            if not -len(self.x) <= i < len(self.x):
+                raise IndexError("city index out of range")
+            row = memoryview(self.row(i))
+            self.cache[i] = row
+            if len(self.cache) > self.cache_rows:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(i)
+        return row
+
+    def __iter__(self):
+        for i in range(len(self.x)):
+            yield self[i]
+
+    def row(self, i):
+        """"Distances from city i to every city (not cached)"""
+        return self.dist(i, slice(None))
+
+    def pairs(self, i, j):
+        """"Distances between cities i[k] and j[k] (arrays of the same shape) without touching the cache"""
+        r = np.asarray(KERNELS[self.metric](self.x[i], self.y[i], self.x[j], self.y[j]), dtype=self.dtype)
+        return np.where(np.asarray(i) == np.asarray(j), r.dtype.type(0), r)
+
+    def dist(self, i, j):
+        """"Distances from city i to city (or array/slice of cities) j without touching the cache"""
+        r = np.asarray(KERNELS[self.metric](self.x[i], self.y[i], self.x[j], self.y[j]), dtype=self.dtype)
+        if r.ndim == 0:
+            return r.dtype.type(0) if i == j else r[()]
+        if isinstance(j, slice):
+            if j == slice(None):
+                r[i] = 0
+        else:
+            r[np.asarray(j) == i] = 0
+        return r
+
+
+def as_array(d):
+    """"NumPy view of a distance matrix (no copy when d is a Matrix or an ndarray)"""
+    if isinstance(d, Matrix):
+        return d.array
+    if isinstance(d, Oracle):
+        return np.vstack([d.row(i) for i in range(len(d))])
+    return np.asarray(d)
+
+
+def coord_array(coord):
+    """"Coordinates of the cities as an n x 2 float64 array"""
+    return np.array([(x, y) for (i, x, y) in coord], dtype=np.float64).reshape(-1, 2)
+
+
+def matrix_mb(n, dtype=np.float64):
+    """"Memory (MB) required by a full n x n distance matrix"""
+    return n * n * np.dtype(dtype).itemsize / 2 ** 20
+
+
+# ================================== TSPLIB95 distance kernels (broadcastable) =========================================
+def nint(v):
+    """"Nearest integer as defined by TSPLIB95: (int) (v + 0.5)"""
+    return np.floor(v + 0.5)
+
+
+def euc_2d(xa, ya, xb, yb):
+    """"Euclidean distance rounded to the nearest integer"""
+    return nint(np.hypot(xa - xb, ya - yb))
+
+
+def ceil_2d(xa, ya, xb, yb):
+    """"Euclidean distance rounded up"""
+    return np.ceil(np.hypot(xa - xb, ya - yb))
+
+
+def man_2d(xa, ya, xb, yb):
+    """"Manhattan distance rounded to the nearest integer"""
+    return nint(np.abs(xa - xb) + np.abs(ya - yb))
+
+
+def max_2d(xa, ya, xb, yb):
+    """"Maximum distance (each coordinate difference rounded to the nearest integer)"""
+    return np.maximum(nint(np.abs(xa - xb)), nint(np.abs(ya - yb)))
+
+
+def att(xa, ya, xb, yb):
+    """"Pseudo-Euclidean distance (att48 and att532)"""
+    dx = xa - xb
+    dy = ya - yb
+    r = np.sqrt((dx * dx + dy * dy) / 10.0)
+    t = nint(r)
+    return np.where(t < r, t + 1, t)
+
+
+def geo(lat_a, lon_a, lat_b, lon_b):
+    """"Geographical distance (coordinates already converted to radians by geo_radians)"""
+    q1 = np.cos(lon_a - lon_b)
+    q2 = np.cos(lat_a - lat_b)
+    q3 = np.cos(lat_a + lat_b)
+    return np.trunc(RRR * np.arccos(np.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1.0, 1.0)) + 1.0)
+
+
+def geo_radians(xy):
+    """"Convert TSPLIB95 GEO coordinates (DDD.MM degrees and minutes) to radians"""
+    deg = np.trunc(xy)
+    return PI * (deg + 5.0 * (xy - deg) / 3.0) / 180.0
+
+
+KERNELS = {"EUC_2D": euc_2d, "CEIL_2D": ceil_2d, "MAN_2D": man_2d, "MAX_2D": max_2d, "ATT": att, "GEO": geo}
+TRANSFORMS = {"GEO": geo_radians}
+
+
+def prepare(metric, xy):
+    """"Coordinates in the form expected by the kernel of the given metric"""
+    if metric not in KERNELS:
+        raise ValueError(f'Unsupported EDGE_WEIGHT_TYPE {metric}')
+    xy = np.asarray(xy, dtype=np.float64)
+    return TRANSFORMS[metric](xy) if metric in TRANSFORMS else xy
+
+
+def matrix(xy, metric="EUC_2D", dtype=np.float64):
+    """"Full distance matrix computed by broadcasting the metric kernel over blocks of rows"""
+    xy = prepare(metric, xy)
+    n = len(xy)
+    kernel = KERNELS[metric]
+    x = xy[:, 0]
+    y = xy[:, 1]
+    d = np.empty((n, n), dtype=dtype)
+    step = max(1, BLOCK // max(1, n))
+    for a in range(0, n, step):
+        b = min(n, a + step)
+        d[a:b] = kernel(x[a:b, None], y[a:b, None], x[None, :], y[None, :])
+    np.fill_diagonal(d, 0)
+    return Matrix(d)
+
+
+def oracle(xy, metric="EUC_2D", dtype=np.float64, cache_mb=256):
+    """"Distance oracle whose row cache uses at most cache_mb MB"""
+    row_mb = matrix_mb(len(xy), dtype) / max(1, len(xy))
+    return Oracle(xy, dtype, int(cache_mb / row_mb) if row_mb > 0 else 1, metric)
+
+
+def explicit_matrix(weights, n, edge_weight_format="FULL_MATRIX", dtype=np.float64):
+    """"Full distance matrix from the EDGE_WEIGHT_SECTION values of an EXPLICIT instance
+    (column-wise formats of a symmetric matrix are the row-wise formats of its transpose)"""
+    d = np.zeros((n, n), dtype=dtype)
+    weights = np.asarray(weights, dtype=np.float64)
+    fmt = {"UPPER_COL": "LOWER_ROW", "LOWER_COL": "UPPER_ROW",
+           "UPPER_DIAG_COL": "LOWER_DIAG_ROW", "LOWER_DIAG_COL": "UPPER_DIAG_ROW"}.get(edge_weight_format,
+                                                                                       edge_weight_format)
+    if fmt == "FULL_MATRIX":
+        rows, cols = np.indices((n, n)).reshape(2, -1)
+    elif fmt == "UPPER_ROW":
+        rows, cols = np.triu_indices(n, 1)
+    elif fmt == "LOWER_ROW":
+        rows, cols = np.tril_indices(n, -1)
+    elif fmt == "UPPER_DIAG_ROW":
+        rows, cols = np.triu_indices(n, 0)
+    elif fmt == "LOWER_DIAG_ROW":
+        rows, cols = np.tril_indices(n, 0)
+    else:
+        raise ValueError(f'Unsupported EDGE_WEIGHT_FORMAT {edge_weight_format}')
+    if len(weights) < len(rows):
+        raise ValueError(f'EDGE_WEIGHT_SECTION has {len(weights)} values, {len(rows)} expected')
+    if fmt != "FULL_MATRIX":
+        d[cols, rows] = weights[:len(rows)]
+    d[rows, cols] = weights[:len(rows)]
+    return Matrix(d)
@@ -1,10 +1,20 @@
 import tsp
+import distance
+import stats
 import random
 import time
+from collections import deque
+import heapq
+import numpy as np
 
 
 EPS = 0.0001  # to avoid numerical issues when comparing float values
 MAX_K = 2     # number of neighborhood structures
+LIST_NEIGHBORHOODS = ("lk",)  # VND neighborhoods scanning candidate lists even if -candidates is 0
+OR_OPT_MAX = 3  # maximum length of the segments moved by Or-opt
+LK_DEPTH = 30         # maximum number of flips of a Lin-Kernighan move
+LK_BREADTH = (5, 3)   # alternatives tried at the first levels of a Lin-Kernighan move (1 at deeper levels)
+BLOCK = 1 << 20  # maximum number of 2-opt moves evaluated at once by NumPy
 
 
 def get_two_opt_first_neighbor_sample(d, s, fs):
@@ -51,6 +61,73 @@ def get_two_opt_neighbors(d, s, fs):
     return N
 
 
+def best_two_opt_move(d, s, fs, cand=None, tabu=None, fs_star=float("-inf")):
+    """"Best 2-opt neighbor (fs, i, j) of s with all moves evaluated by NumPy (in blocks of moves), or only the moves
+    adding a candidate edge if cand lists are given; moves removing two tabu edges (tabu[x]: edge (s[x], s[x+1])) are
+    skipped unless they lead to a cost below fs_star (aspiration criterion). d must be a distance matrix"""
+    a = distance.as_array(d)
+    t = s.t_view if isinstance(s, tsp.Tour) else np.asarray(s)
+    n = len(t) - 1
+    best = (np.inf, 0, 0)
+    if cand is None:
+        best = best_two_opt_rows(a, t, fs, 0, n - 2, tabu, fs_star)
+    else:
+        cand = np.asarray(cand)
+        pos = np.empty(n, dtype=np.intp)
+        pos[t[:n]] = np.arange(n)
+        p = np.repeat(np.arange(n), cand.shape[1])
+        q = pos[cand[t[:n]].ravel()]
+        # new edge (a, c) with (next(a), next(c)) or with (prev(a), prev(c)), as edge indexes x < y
+        x = np.concatenate((p, (p - 1) % n))
+        y = np.concatenate((q, (q - 1) % n))
+        x, y = np.minimum(x, y), np.maximum(x, y)
+        keep = (y - x >= 2) & ((x != 0) | (y != n - 1))
+        x, y = x[keep], y[keep]
+        delta = tsp.two_opt_deltas(a, t, x, y)
+        if tabu is not None:
+            delta[tabu[x] & tabu[y] & (fs + delta >= fs_star)] = np.inf
+        if len(delta):
+            k = int(np.argmin(delta))
+            best = (delta[k], x[k], y[k])
+    if best[0] == np.inf:
+        return None
+    return fs + float(best[0]), int(best[1]) + 1, int(best[2])
+
+
+def best_two_opt_rows(a, t, fs, x_lo, x_hi, tabu=None, fs_star=float("-inf")):
+    """"Best 2-opt move (delta, x, y) removing edges (t[x], t[x+1]) and (t[y], t[y+1]) for rows x_lo <= x < x_hi
+    (all y >= x + 2), evaluated by NumPy in blocks of rows; delta is inf if there is no (non tabu) move"""
+    n = len(t) - 1
+    best = (np.inf, 0, 0)
+    w = a[t[:-1], t[1:]]  # w[k]: length of edge (t[k], t[k+1])
+    step = max(1, BLOCK // n)
+    for x0 in range(x_lo, x_hi, step):
+        # rows x = x0...x1-1 and columns y = x0+2...n-1 (the distances between their cities gathered once)
+        x1 = min(x_hi, x0 + step)
+        P = a[t[x0:x1 + 1]][:, t[x0 + 2:]]
+        delta = P[:-1, :-1] + P[1:, 1:] - w[x0:x1, None] - w[None, x0 + 2:]
+        delta[np.tri(*delta.shape, -1, dtype=bool)] = np.inf  # y < x + 2
+        if x0 == 0:
+            delta[0, n - 3] = np.inf  # reversing s[1...n-1] gives the same tour
+        if stats.ENABLED:
+            stats.count("2opt", int(np.count_nonzero(delta < np.inf)), int(np.count_nonzero(delta < -EPS)))
+        if tabu is not None:
+            delta[tabu[x0:x1, None] & tabu[None, x0 + 2:] & (fs + delta >= fs_star)] = np.inf
+        r, c = divmod(int(np.argmin(delta)), delta.shape[1])
+        if delta[r, c] < best[0]:
+            best = (delta[r, c], x0 + r, x0 + 2 + c)
+    return best
+
+
+def get_two_opt_best_neighbor(d, s, fs, cand=None):
+    """Get the best improving 2-opt neighbor (evaluated by NumPy). A neighbor represented as: [fs, i, j]"""
+    N = []
+    m = best_two_opt_move(d, s, fs, cand)
+    if m is not None and m[0] + EPS < fs:
+        N.append(m)
+    return N
+
+
 def get_two_opt_random_neighbor(d, s, fs):
     """Get a random 2-opt neighbor represented as: [fs, i, j]"""
     N = []
@@ -149,10 +226,344 @@ def get_random_neighbor(d, fs, s):
         return get_three_opt_random_neighbor(d, s, fs)
 
 
-def descent_two_opt(d, s, fs):
-    """Descent local search method (2-opt) for TSP"""
+def get_two_opt_random_city_neighbor(d, t, fs):
+    """Get a random 2-opt neighbor of a tour given by next/prev (any representation) as: [fs, a, c]"""
+    N = []
+    n = len(d)
+    a = random.randrange(n)
+    c = random.randrange(n)
+    while c == a or c == t.next(a) or c == t.prev(a):
+        c = random.randrange(n)
+    N.append((tsp.two_opt_city(d, t, fs, a, c), a, c))
+    return N
+
+
+def get_or_opt_random_city_neighbor(d, t, fs):
+    """Get a random Or-opt neighbor of a tour given by next/prev (any representation) as: [fs, a, b, c, rev]"""
+    N = []
+    n = len(d)
+    a = b = random.randrange(n)
+    for _ in range(random.randrange(min(OR_OPT_MAX, n - 3))):
+        b = t.next(b)
+    c = random.randrange(n)
+    while c == t.prev(a) or t.between(a, c, b):
+        c = random.randrange(n)
+    rev = random.random() < 0.5
+    N.append((tsp.or_opt_city(d, t, fs, a, b, c, rev), a, b, c, rev))
+    return N
+
+
+def get_random_city_neighbor(d, fs, t):
+    """Get either a 2-opt (50% odd) or an Or-opt city neighbor (50% odd)"""
+    r = random.random()
+    if r < 0.5:
+        return get_two_opt_random_city_neighbor(d, t, fs)
+    else:
+        return get_or_opt_random_city_neighbor(d, t, fs)
+
+
+def two_opt_candidate_moves(d, s, pos, cand, p):
+    """"2-opt moves (i, j) adding an edge between the city at position p and one of its candidates
+    Candidates are sorted by distance, so the scan stops at the first one not closer than the removed edge"""
+    n = len(s) - 1
+    a = s[p]
+    # new edges (a, c) and (next(a), next(c))
+    g = d[a][s[p + 1]]
+    for c in cand[a]:
+        if d[a][c] >= g:
+            break
+        q = pos[c]
+        i_idx, j_idx = (p + 1, q) if p < q else (q + 1, p)
+        if i_idx < j_idx:
+            yield i_idx, j_idx
+    # new edges (a, c) and (prev(a), prev(c)) (the city at position 0 is also at position n)
+    p = p or n
+    g = d[a][s[p - 1]]
+    for c in cand[a]:
+        if d[a][c] >= g:
+            break
+        q = pos[c] or n
+        i_idx, j_idx = (p, q - 1) if p < q else (q, p - 1)
+        if i_idx < j_idx:
+            yield i_idx, j_idx
+
+
+def three_opt_candidate_moves(d, s, pos, cand, p):
+    """"3-opt moves (i, j, k) built sequentially from the edge at position p: edge (t1, t2) is removed, then edges
+    (t2, t3) and (t4, t5) to candidate cities are added and edges (t3, t4) and (t5, t6) next to them are removed,
+    as long as the partial gain stays positive (O(k^2) moves per edge; tsp.three_opt picks the best reconnection)"""
+    n = len(s) - 1
+    for t1, t2 in ((s[p], s[p + 1]), (s[p + 1], s[p])):
+        g0 = d[t1][t2]
+        for t3 in cand[t2]:
+            g1 = g0 - d[t2][t3]
+            if g1 <= 0:  # candidates are sorted by distance: no positive gain from here on
+                break
+            q = pos[t3]
+            for j_idx in (q, q - 1 if q else n - 1):  # edge (t3, next(t3)) or (prev(t3), t3)
+                if j_idx == p:
+                    continue
+                t4 = s[j_idx + 1] if j_idx == q else s[j_idx]
+                g2 = g1 + d[t3][t4]
+                for t5 in cand[t4]:
+                    if g2 - d[t4][t5] <= 0:
+                        break
+                    r = pos[t5]
+                    for k_idx in (r, r - 1 if r else n - 1):
+                        if k_idx != p and k_idx != j_idx:
+                            m = tuple(sorted((p, j_idx, k_idx)))
+                            if m[0] or m[2] != n - 1:  # otherwise [k+1...i] is a single city: a 2-opt move at best
+                                yield m
+
+
+def get_two_opt_candidate_neighbors(d, s, fs, cand):
+    """Get all 2-opt neighbors adding a candidate edge. A neighbor represented as: [fs, i, j]"""
+    N = []
+    pos = tsp.positions(s)
+    for p in range(len(s) - 1):
+        for i_idx, j_idx in two_opt_candidate_moves(d, s, pos, cand, p):
+            s_new_dist = tsp.two_opt(d, s, fs, i_idx, j_idx)
+            if s_new_dist + EPS < fs:
+                # add neighbor
+                N.append((s_new_dist, i_idx, j_idx))
+    return N
+
+
+def get_two_opt_candidate_first_neighbor(d, s, fs, cand):
+    """Get first 2-opt neighbor adding a candidate edge (cities scanned in random order). A neighbor represented as: [fs, i, j]"""
+    pos = tsp.positions(s)
+    lst = list(range(len(s) - 1))
+    random.shuffle(lst)
+    for p in lst:
+        for i_idx, j_idx in two_opt_candidate_moves(d, s, pos, cand, p):
+            s_new_dist = tsp.two_opt(d, s, fs, i_idx, j_idx)
+            if s_new_dist + EPS < fs:
+                return [(s_new_dist, i_idx, j_idx)]
+    return []
+
+
+def get_three_opt_candidate_neighbors(d, s, fs, cand):
+    """Get all 3-opt neighbors adding candidate edges. A neighbor represented as: [fs, i, j, k]"""
+    N = []
+    pos = tsp.positions(s)
+    for p in range(len(s) - 1):
+        for i_idx, j_idx, k_idx in three_opt_candidate_moves(d, s, pos, cand, p):
+            fs_line = tsp.three_opt(d, s, fs, i_idx, j_idx, k_idx)
+            if fs_line + EPS < fs:
+                # add neighbor
+                N.append((fs_line, i_idx, j_idx, k_idx))
+    return N
+
+
+def best_three_opt_candidate_move(d, s, fs, cand, p_lo=0, p_hi=None, tabu=None, fs_star=float("-inf")):
+    """"Best 3-opt move (fs, i, j, k) among those built sequentially from the edges at positions p_lo <= p < p_hi
+    (None if there is none); moves removing 2 or more tabu edges (tabu[x]: edge (s[x], s[x+1])) are skipped unless
+    they lead to a cost below fs_star (aspiration criterion)"""
+    pos = tsp.positions(s)
+    best = None
+    best_fs = float("inf")
+    for p in range(p_lo, len(s) - 1 if p_hi is None else p_hi):
+        for i_idx, j_idx, k_idx in three_opt_candidate_moves(d, s, pos, cand, p):
+            fs_line = tsp.three_opt(d, s, fs, i_idx, j_idx, k_idx)
+            if fs_line < best_fs and (tabu is None or tabu[i_idx] + tabu[j_idx] + tabu[k_idx] < 2
+                                      or fs_line < fs_star):
+                best_fs = fs_line
+                best = (fs_line, i_idx, j_idx, k_idx)
+    return best
+
+
+def get_three_opt_candidate_first_neighbor(d, s, fs, cand):
+    """Get first 3-opt neighbor adding candidate edges (cities scanned in random order). A neighbor represented as: [fs, i, j, k]"""
+    pos = tsp.positions(s)
+    lst = list(range(len(s) - 1))
+    random.shuffle(lst)
+    for p in lst:
+        for i_idx, j_idx, k_idx in three_opt_candidate_moves(d, s, pos, cand, p):
+            fs_line = tsp.three_opt(d, s, fs, i_idx, j_idx, k_idx)
+            if fs_line + EPS < fs:
+                return [(fs_line, i_idx, j_idx, k_idx)]
+    return []
+
+
+def or_opt_moves(s, i, l):
+    """"Or-opt moves (i, l, j, rev) of segment [i...i+l-1] to every other edge (j, j+1), in both orientations"""
+    for j_idx in range(0, len(s) - 1):
+        if not i - 1 <= j_idx <= i + l - 1:
+            yield i, l, j_idx, False
+            if l > 1:
+                yield i, l, j_idx, True
+
+
+def or_opt_candidate_moves(s, pos, cand, i, l):
+    """"Or-opt moves (i, l, j, rev) of segment [i...i+l-1] placing one of its end cities next to a candidate city"""
+    n = len(s) - 1
+    first, last = s[i], s[i + l - 1]
+    for c in cand[first]:
+        q = pos[c]
+        for j_idx, rev in ((q, False), (q - 1 if q else n - 1, True)):  # c-first...last or last...first-c
+            if not i - 1 <= j_idx <= i + l - 1:
+                yield i, l, j_idx, rev and l > 1
+    if l > 1:
+        for c in cand[last]:
+            q = pos[c]
+            for j_idx, rev in ((q - 1 if q else n - 1, False), (q, True)):  # first...last-c or c-last...first
+                if not i - 1 <= j_idx <= i + l - 1:
+                    yield i, l, j_idx, rev
+
+
+def get_or_opt_neighbors(d, s, fs, cand=None):
+    """Get all improving Or-opt neighbors (segments of up to OR_OPT_MAX nodes). A neighbor represented as: [fs, i, l, j, rev]"""
+    N = []
+    pos = tsp.positions(s) if cand is not None else None
+    for l in range(1, OR_OPT_MAX + 1):
+        for i_idx in range(1, len(s) - l):
+            moves = or_opt_moves(s, i_idx, l) if cand is None else or_opt_candidate_moves(s, pos, cand, i_idx, l)
+            for i_idx, l, j_idx, rev in moves:
+                fs_ = tsp.or_opt(d, s, fs, i_idx, l, j_idx, rev)
+                if fs_ + EPS < fs:
+                    N.append((fs_, i_idx, l, j_idx, rev))
+    return N
+
+
+def get_or_opt_first_neighbor(d, s, fs, cand=None):
+    """Get first improving Or-opt neighbor (segments scanned in random order). A neighbor represented as: [fs, i, l, j, rev]"""
+    pos = tsp.positions(s) if cand is not None else None
+    segments = [(i_idx, l) for l in range(1, OR_OPT_MAX + 1) for i_idx in range(1, len(s) - l)]
+    random.shuffle(segments)
+    for i_idx, l in segments:
+        moves = or_opt_moves(s, i_idx, l) if cand is None else or_opt_candidate_moves(s, pos, cand, i_idx, l)
+        for i_idx, l, j_idx, rev in moves:
+            fs_ = tsp.or_opt(d, s, fs, i_idx, l, j_idx, rev)
+            if fs_ + EPS < fs:
+                return [(fs_, i_idx, l, j_idx, rev)]
+    return []
+
+
+def swap_candidate_moves(s, pos, cand, i):
+    """"Swap moves (i, j) placing the node at index i next to one of its candidate cities"""
+    n = len(s) - 1
+    for c in cand[s[i]]:
+        q = pos[c]
+        for j_idx in (q - 1, q + 1):
+            if 1 <= j_idx <= n - 1 and j_idx != i:
+                yield i, j_idx
+
+
+def get_swap_neighbors(d, s, fs, cand=None):
+    """Get all improving swap neighbors. A neighbor represented as: [fs, i, j]"""
+    N = []
+    pos = tsp.positions(s) if cand is not None else None
+    for i_idx in range(1, len(s) - 1):
+        if cand is None:
+            moves = ((i_idx, j_idx) for j_idx in range(i_idx + 1, len(s) - 1))
+        else:
+            moves = swap_candidate_moves(s, pos, cand, i_idx)
+        for i_idx, j_idx in moves:
+            s_, fs_ = tsp.swap(d, s, fs, i_idx, j_idx)
+            if fs_ + EPS < fs:
+                N.append((fs_, i_idx, j_idx))
+    return N
+
+
+def get_swap_first_neighbor(d, s, fs, cand=None):
+    """Get first improving swap neighbor (nodes scanned in random order). A neighbor represented as: [fs, i, j]"""
+    pos = tsp.positions(s) if cand is not None else None
+    lst = list(range(1, len(s) - 1))
+    random.shuffle(lst)
+    for i_idx in lst:
+        if cand is None:
+            moves = ((i_idx, j_idx) for j_idx in lst if j_idx != i_idx)
+        else:
+            moves = swap_candidate_moves(s, pos, cand, i_idx)
+        for i_idx, j_idx in moves:
+            s_, fs_ = tsp.swap(d, s, fs, i_idx, j_idx)
+            if fs_ + EPS < fs:
+                return [(fs_, i_idx, j_idx)]
+    return []
+
+
+def two_opt_descent_neighbors(d, s, fs, cand, vectorized, pool=None):
+    """Improving 2-opt neighbors examined by descent_two_opt (just the best one when evaluated by NumPy)"""
+    if vectorized and pool is not None and cand is None:  # row ranges evaluated by the processes of the pool
+        m = pool.best_two_opt_move(s, fs)
+        return [m] if m is not None and m[0] + EPS < fs else []
+    if vectorized:
+        return get_two_opt_best_neighbor(d, s, fs, cand)
+    if cand is None:
+        return get_two_opt_neighbors(d, s, fs)
+    return get_two_opt_candidate_neighbors(d, s, fs, cand)
+
+
+def edge_index(s, a, b):
+    """"Index x of the tour edge {a, b} (s[x], s[x+1]) of a Tour, or -1 if cities a and b are no longer adjacent"""
+    p = s.pos[a]
+    if s[p + 1] == b:
+        return p
+    p = p - 1 if p else len(s) - 2
+    return p if s[p] == b else -1
+
+
+def incremental_descent(d, s, fs, cand, three=False):
+    """"Best-improvement descent (2-opt, or 3-opt if three) over the moves built from candidate lists, keeping the
+    improving moves in a priority queue keyed by their cost variation instead of rescanning the whole neighborhood
+    after each move. A move is stored by the cities of its removed edges: when popped it is dropped if one of them
+    was removed meanwhile, and pushed back if its variation changed (lazy invalidation). After a move only the edges
+    at the touched cities are scanned again; a full scan when the queue empties confirms the local optimum"""
+    t_init = time.time()
+    s = s if isinstance(s, tsp.Tour) else tsp.Tour(s)
+    n = len(s) - 1
+    pos = s.pos
+    heap = []
+
+    def scan(p):  # push the improving moves built from the edge (city) at position p
+        if three:
+            for i, j, k in three_opt_candidate_moves(d, s, pos, cand, p):
+                delta = tsp.three_opt(d, s, fs, i, j, k) - fs
+                if delta + EPS < 0:
+                    heapq.heappush(heap, (delta, (s[i], s[i + 1], s[j], s[j + 1], s[k], s[k + 1])))
+        else:
+            for i, j in two_opt_candidate_moves(d, s, pos, cand, p):
+                delta = tsp.two_opt(d, s, fs, i, j) - fs
+                if delta + EPS < 0:
+                    heapq.heappush(heap, (delta, (s[i - 1], s[i], s[j], s[j + 1])))
+
+    while True:
+        if not heap:
+            for p in range(n):
+                scan(p)
+            if not heap:
+                break
+        delta, cities = heapq.heappop(heap)
+        idx = sorted(edge_index(s, cities[e], cities[e + 1]) for e in range(0, len(cities), 2))
+        if idx[0] < 0 or len(set(idx)) < len(idx):
+            continue  # one of its edges was removed by a previous move
+        touched = [c for x in idx for c in (s[x], s[x + 1])]
+        fs_ = tsp.three_opt(d, s, fs, *idx) if three else tsp.two_opt(d, s, fs, idx[0] + 1, idx[1])
+        if fs_ - fs > delta + EPS:  # stale variation
+            if fs_ + EPS < fs:
+                heapq.heappush(heap, (fs_ - fs, tuple(touched)))
+            continue
+        if three:
+            s, fs = tsp.three_opt_move(d, s, fs, *idx)
+        else:
+            s, fs = tsp.two_opt_move(d, s, fs, idx[0] + 1, idx[1])
+        for c in touched:
+            scan(pos[c])
+    return s, fs, time.time() - t_init
+
+
+def descent_two_opt(d, s, fs, cand=None, pool=None):
+    """Descent local search method (2-opt) for TSP (only moves adding candidate edges if cand lists are given)
+    With candidate lists the improving moves are kept in a priority queue (incremental_descent); otherwise the whole
+    neighborhood is evaluated at once by NumPy, unless d is a distance oracle (split among the processes of a
+    parallel.NeighborhoodPool if one is given)"""
+    if cand is not None and pool is None:
+        return incremental_descent(d, s, fs, cand)
     t_init = time.time()
-    N = get_two_opt_neighbors(d, s, fs)
+    vectorized = not isinstance(d, distance.Oracle)
+    if vectorized and cand is not None:
+        cand = np.asarray(cand)  # converted once for the whole descent
+    N = two_opt_descent_neighbors(d, s, fs, cand, vectorized, pool)
     while N:
         # select best neighbor
         best_n = -1
@@ -164,14 +575,28 @@ def descent_two_opt(d, s, fs):
         # move to next neighbor
         s, fs = tsp.two_opt_move(d, s, fs, best_n[1], best_n[2])
         # print(round(s_dist, 2))
-        N = get_two_opt_neighbors(d, s, fs)
+        N = two_opt_descent_neighbors(d, s, fs, cand, vectorized, pool)
     return s, fs, time.time() - t_init
 
 
-def descent_three_opt(d, s, fs):
-    """Descent local search method (3-opt) for TSP"""
+def three_opt_descent_neighbors(d, s, fs, cand, pool=None):
+    """Improving 3-opt neighbors examined by descent_three_opt (just the best one when evaluated by a pool)"""
+    if pool is not None and cand is not None:  # edge ranges evaluated by the processes of the pool
+        m = pool.best_three_opt_move(s, fs)
+        return [m] if m is not None and m[0] + EPS < fs else []
+    if cand is None:
+        return get_three_opt_neighbors(d, s, fs)
+    return get_three_opt_candidate_neighbors(d, s, fs, cand)
+
+
+def descent_three_opt(d, s, fs, cand=None, pool=None):
+    """Descent local search method (3-opt) for TSP (moves built sequentially from candidate edges if cand lists are
+    given, O(n k^2) per scan, kept in a priority queue by incremental_descent or split among the processes of a
+    parallel.NeighborhoodPool if one is given; otherwise all O(n^3) index triples)"""
+    if cand is not None and pool is None:
+        return incremental_descent(d, s, fs, cand, three=True)
     t_init = time.time()
-    N = get_three_opt_neighbors(d, s, fs)
+    N = three_opt_descent_neighbors(d, s, fs, cand, pool)
     while N:
         # select best neighbor
         best_n = -1
@@ -182,44 +607,245 @@ def descent_three_opt(d, s, fs):
                 best_n = n
         # move to next neighbor
         (s, fs) = tsp.three_opt_move(d, s, fs, best_n[1], best_n[2], best_n[3])
-        N = get_three_opt_neighbors(d, s, fs)
+        N = three_opt_descent_neighbors(d, s, fs, cand, pool)
+    return s, fs, time.time() - t_init
+
+
+def descent_or_opt(d, s, fs, cand=None):
+    """Descent local search method (Or-opt) for TSP"""
+    t_init = time.time()
+    N = get_or_opt_neighbors(d, s, fs, cand)
+    while N:
+        # move to best neighbor
+        best_n = min(N)
+        s, fs = tsp.or_opt_move(d, s, fs, best_n[1], best_n[2], best_n[3], best_n[4])
+        N = get_or_opt_neighbors(d, s, fs, cand)
+    return s, fs, time.time() - t_init
+
+
+def descent_swap(d, s, fs, cand=None):
+    """Descent local search method (swap) for TSP"""
+    t_init = time.time()
+    N = get_swap_neighbors(d, s, fs, cand)
+    while N:
+        # move to best neighbor
+        best_n = min(N)
+        s, fs = tsp.swap_move(d, s, fs, best_n[1], best_n[2])
+        N = get_swap_neighbors(d, s, fs, cand)
     return s, fs, time.time() - t_init
 
 
-def first_improvement_two_opt(d, s, fs):
-    """First improvement local search method (2-opt) for TSP"""
+def first_improvement_two_opt(d, s, fs, cand=None):
+    """First improvement local search method (2-opt) for TSP (only moves adding candidate edges if cand lists are given)"""
     t_init = time.time()
-    N = get_two_opt_first_neighbor_sample(d, s, fs)
+    N = get_two_opt_first_neighbor_sample(d, s, fs) if cand is None else get_two_opt_candidate_first_neighbor(d, s, fs, cand)
     while N:
         # move to next neighbor
         s, fs = tsp.two_opt_move(d, s, fs, N[0][1], N[0][2])
-        N = get_two_opt_first_neighbor_sample(d, s, fs)
+        N = get_two_opt_first_neighbor_sample(d, s, fs) if cand is None else get_two_opt_candidate_first_neighbor(d, s, fs, cand)
     return s, fs, time.time() - t_init
 
 
-def first_improvement_three_opt(d, s, fs):
-    """First improvement local search method (3-opt) for TSP"""
+def first_improvement_three_opt(d, s, fs, cand=None):
+    """First improvement local search method (3-opt) for TSP (moves built sequentially from candidate edges if cand
+    lists are given, O(n k^2) per scan; otherwise all O(n^3) index triples)"""
     t_init = time.time()
-    N = get_three_opt_first_neighbor_sample(d, s, fs)
+    N = get_three_opt_first_neighbor_sample(d, s, fs) if cand is None else get_three_opt_candidate_first_neighbor(d, s, fs, cand)
     while N:
         # move to next neighbor
         s, fs = tsp.three_opt_move(d, s, fs, N[0][1], N[0][2], N[0][3])
         # print(round(s_dist, 2))
-        N = get_three_opt_first_neighbor_sample(d, s, fs)
+        N = get_three_opt_first_neighbor_sample(d, s, fs) if cand is None else get_three_opt_candidate_first_neighbor(d, s, fs, cand)
+    return s, fs, time.time() - t_init
+
+
+def first_improvement_or_opt(d, s, fs, cand=None):
+    """First improvement local search method (Or-opt) for TSP"""
+    t_init = time.time()
+    N = get_or_opt_first_neighbor(d, s, fs, cand)
+    while N:
+        # move to next neighbor
+        s, fs = tsp.or_opt_move(d, s, fs, N[0][1], N[0][2], N[0][3], N[0][4])
+        N = get_or_opt_first_neighbor(d, s, fs, cand)
+    return s, fs, time.time() - t_init
+
+
+def first_improvement_swap(d, s, fs, cand=None):
+    """First improvement local search method (swap) for TSP"""
+    t_init = time.time()
+    N = get_swap_first_neighbor(d, s, fs, cand)
+    while N:
+        # move to next neighbor
+        s, fs = tsp.swap_move(d, s, fs, N[0][1], N[0][2])
+        N = get_swap_first_neighbor(d, s, fs, cand)
+    return s, fs, time.time() - t_init
+
+
+def dlb_two_opt(d, s, fs, cand):
+    """First improvement local search method (2-opt) with don't-look bits for TSP
+    Only cities in the queue (initially all of them) are examined; after a move, just the endpoints
+    of the changed edges are queued again, so late improvements cost O(k) instead of O(n^2)
+    Moves are given by cities (next/prev), so it runs on both Tour and TwoLevelList tours"""
+    t_init = time.time()
+    s = s if isinstance(s, (tsp.Tour, tsp.TwoLevelList)) else tsp.Tour(s)
+    n = len(d)
+    queue = deque(random.sample(range(n), n))
+    active = [True] * n  # active[c] is False when the don't-look bit of city c is set
+    while queue:
+        a = queue.popleft()
+        active[a] = False
+        move = None
+        # new edges (a, c) and (next(a), next(c))
+        g = d[a][s.next(a)]
+        for c in cand[a]:
+            if d[a][c] >= g:
+                break
+            if tsp.two_opt_city(d, s, fs, a, c) + EPS < fs:
+                move = (a, c)
+                break
+        if move is None:
+            # new edges (a, c) and (prev(a), prev(c))
+            b = s.prev(a)
+            g = d[a][b]
+            for c in cand[a]:
+                if d[a][c] >= g:
+                    break
+                e = s.prev(c)
+                if tsp.two_opt_city(d, s, fs, b, e) + EPS < fs:
+                    move = (b, e)
+                    break
+        if move is not None:
+            x, y = move
+            ends = (x, s.next(x), y, s.next(y))
+            s, fs = tsp.two_opt_city_move(d, s, fs, x, y)
+            for c in ends:
+                if not active[c]:
+                    active[c] = True
+                    queue.append(c)
+    return s, fs, time.time() - t_init
+
+
+def dlb_three_opt(d, s, fs, cand):
+    """First improvement local search method (3-opt) with don't-look bits for TSP"""
+    t_init = time.time()
+    s = s if isinstance(s, tsp.Tour) else tsp.Tour(s)  # positions are kept up to date by the moves
+    pos = s.pos
+    queue = deque(random.sample(s[:-1], len(s) - 1))
+    active = [True] * (len(s) - 1)  # active[c] is False when the don't-look bit of city c is set
+    while queue:
+        a = queue.popleft()
+        active[a] = False
+        for i_idx, j_idx, k_idx in three_opt_candidate_moves(d, s, pos, cand, pos[a]):
+            fs_ = tsp.three_opt(d, s, fs, i_idx, j_idx, k_idx)
+            if fs_ + EPS < fs:
+                ends = (s[i_idx], s[i_idx + 1], s[j_idx], s[j_idx + 1], s[k_idx], s[k_idx + 1])
+                s, fs = tsp.three_opt_move(d, s, fs, i_idx, j_idx, k_idx)
+                for c in ends:
+                    if not active[c]:
+                        active[c] = True
+                        queue.append(c)
+                break
+    return s, fs, time.time() - t_init
+
+
+def lk_move(d, s, fs, cand, t1, t2):
+    """"Variable-depth Lin-Kernighan move starting by removing edge (t1, t2)
+    At each level, the edge (t2, t3) to a candidate t3 is added and the edge (t3, t4) that keeps a tour when (t1, t4)
+    closes it is removed (a 2-opt flip); the partial gain must stay positive, the alternatives of the first levels are
+    tried in order of decreasing gain (LK_BREADTH) and the chain goes deeper while it can, up to LK_DEPTH flips.
+    Returns the cost and the cities touched by the kept flips (None, after rolling everything back, if no gain)"""
+    flips = []       # applied flips (t2, t3, t4)
+    best = [fs, 0]   # best cost found and number of flips leading to it
+    added = set()    # edges added by the chain (they cannot be removed again)
+
+    def step(t2, g, fs, level):
+        fwd = s.next(t1) == t2  # the orientation may be flipped by the reversals
+        succ_t2 = s.next(t2) if fwd else s.prev(t2)
+        alternatives = []
+        for t3 in cand[t2]:
+            g1 = g - d[t2][t3]
+            if g1 <= EPS:  # candidates are sorted by distance: no positive gain from here on
+                break
+            if t3 == t1 or t3 == succ_t2:
+                continue
+            t4 = s.prev(t3) if fwd else s.next(t3)
+            if (min(t3, t4), max(t3, t4)) in added:
+                continue
+            alternatives.append((g1 + d[t3][t4], t3, t4))
+        alternatives.sort(reverse=True)
+        for g2, t3, t4 in alternatives[:LK_BREADTH[level] if level < len(LK_BREADTH) else 1]:
+            fs_ = fs + d[t1][t4] + d[t2][t3] - d[t1][t2] - d[t3][t4]
+            if stats.ENABLED:
+                stats.count("lk", 1, fs_ + EPS < best[0])
+            tsp.reconnect(s, t1, t2, t4, t3)  # (t1, t2) and (t4, t3) replaced by (t1, t4) and (t2, t3)
+            flips.append((t2, t3, t4))
+            added.add((min(t2, t3), max(t2, t3)))
+            if fs_ + EPS < best[0]:
+                best[0], best[1] = fs_, len(flips)
+            if len(flips) < LK_DEPTH:
+                step(t4, g2, fs_, level + 1)
+            if best[1]:  # improvement found: keep going deeper only (the extra flips are rolled back below)
+                return
+            flips.pop()
+            added.discard((min(t2, t3), max(t2, t3)))
+            tsp.reconnect(s, t1, t4, t2, t3)  # undo the flip
+
+    step(t2, d[t1][t2], fs, 0)
+    while len(flips) > best[1]:
+        t2, t3, t4 = flips.pop()
+        tsp.reconnect(s, t1, t4, t2, t3)
+    if not flips:
+        return fs, None
+    touched = {t1}
+    for f in flips:
+        touched.update(f)
+    return best[0], touched
+
+
+def lin_kernighan(d, s, fs, cand):
+    """Lin-Kernighan style variable-depth local search method for TSP
+    Each city in the queue (initially all of them) starts lk_move from both of its tour edges; after an improving
+    move, the cities it touched are queued again (don't-look bits). Works on Tour and TwoLevelList tours"""
+    t_init = time.time()
+    s = s if isinstance(s, (tsp.Tour, tsp.TwoLevelList)) else tsp.Tour(s)
+    n = len(d)
+    queue = deque(random.sample(range(n), n))
+    active = [True] * n  # active[c] is False when the don't-look bit of city c is set
+    while queue:
+        a = queue.popleft()
+        active[a] = False
+        for b in (s.next(a), s.prev(a)):
+            fs_, touched = lk_move(d, s, fs, cand, a, b)
+            if touched:
+                fs = fs_
+                if stats.ENABLED:
+                    stats.count("lk", accepted=1)
+                for c in touched:
+                    if not active[c]:
+                        active[c] = True
+                        queue.append(c)
+                break
     return s, fs, time.time() - t_init
 
 
 def random_descent_two_opt(d, s, fs, max_it):
-    """Random descent local search method (2-opt) for TSP"""
+    """Random descent local search method (2-opt) for TSP (city-based moves on a TwoLevelList tour)"""
     t_init = time.time()
+    linked = isinstance(s, tsp.TwoLevelList)
     it = 0
     while it < max_it:
         it += 1
-        N = get_two_opt_random_neighbor(d, s, fs)
+        if linked:
+            N = get_two_opt_random_city_neighbor(d, s, fs)
+        else:
+            N = get_two_opt_random_neighbor(d, s, fs)
         if N[0][0] + EPS < fs:
             it = 0
             # apply and accept move
-            s, fs = tsp.two_opt_move(d, s, fs, N[0][1], N[0][2])
+            if linked:
+                s, fs = tsp.two_opt_city_move(d, s, fs, N[0][1], N[0][2])
+            else:
+                s, fs = tsp.two_opt_move(d, s, fs, N[0][1], N[0][2])
     return s, fs, time.time() - t_init
 
 
@@ -259,51 +885,69 @@ def random_descent(d, s, fs, max_it):
     return s, fs, time.time() - t_init
 
 
-def vnd(d, s, fs, max_k):
-    """Variable neighborhood descent method for TSP (k=1: 2-opt k=2: 3-opt)"""
+def vnd(d, s, fs, max_k, cand=None, order=None, restrict=True):
+    """Variable neighborhood descent method for TSP (k=1: 2-opt k=2: 3-opt, or the given order of neighborhoods)
+    The candidate lists restrict the other neighborhoods only if restrict is set"""
     t_init = time.time()
-    k = 1
-    while k <= max_k:
-        if k == 1:
-            s_line, fs_line, t = descent_two_opt(d, s, fs)
-        elif k == 2:
-            s_line, fs_line, t = descent_three_opt(d, s, fs)
+    order = order or VND_ORDER[:max_k]
+    k = 0
+    while k < len(order):
+        c = cand if restrict or order[k] in LIST_NEIGHBORHOODS else None
+        with stats.phase(order[k]):
+            s_line, fs_line, t = DESCENTS[order[k]](d, s, fs, c)
         if fs_line < fs:
-            s = s_line[:]
+            s = s_line
             fs = fs_line
-            k = 1
+            k = 0
         else:
             k += 1
     return s, fs, time.time() - t_init
 
 
-def vnd_first_improvement(d, s, fs, max_k):
-    """Variable neighborhood descent method for TSP (k=1: 2-opt k=2: 3-opt)"""
+def vnd_first_improvement(d, s, fs, max_k, cand=None, order=None, restrict=True):
+    """Variable neighborhood descent method for TSP (k=1: 2-opt k=2: 3-opt, or the given order of neighborhoods)
+    The candidate lists restrict the other neighborhoods only if restrict is set"""
     t_init = time.time()
-    k = 1
-    while k <= max_k:
-        if k == 1:
-            s_line, fs_line, t = first_improvement_two_opt(d, s, fs)
-        elif k == 2:
-            s_line, fs_line, t = first_improvement_three_opt(d, s, fs)
+    order = order or VND_ORDER[:max_k]
+    k = 0
+    while k < len(order):
+        c = cand if restrict or order[k] in LIST_NEIGHBORHOODS else None
+        with stats.phase(order[k]):
+            s_line, fs_line, t = FIRST_IMPROVEMENTS[order[k]](d, s, fs, c)
         if fs_line < fs:
-            s = s_line[:]
+            s = s_line
             fs = fs_line
-            k = 1
+            k = 0
         else:
             k += 1
     return s, fs, time.time() - t_init
 
 
+# neighborhood structures available to VND (-vnd_order)
+DESCENTS = {"2opt": descent_two_opt, "3opt": descent_three_opt, "oropt": descent_or_opt, "swap": descent_swap,
+            "lk": lin_kernighan}
+FIRST_IMPROVEMENTS = {"2opt": first_improvement_two_opt, "3opt": first_improvement_three_opt,
+                      "oropt": first_improvement_or_opt, "swap": first_improvement_swap, "lk": lin_kernighan}
+VND_ORDER = ["2opt", "3opt"]  # default order (the first neigh_types neighborhoods are used)
+
+
 def local_search(d, s, fs, params):
+    # candidate lists restrict the 2-opt and 3-opt neighborhoods only if -candidates is set (DLB and LK always scan them)
+    cand = params.cand if params.candidates > 0 else None
     if params.localsearch == "DESCENT2":
-        s_, fs_, t = descent_two_opt(d, s, fs)
+        s_, fs_, t = descent_two_opt(d, s, fs, cand, params.pool)
     elif params.localsearch == "DESCENT3":
-        s_, fs_, t = descent_three_opt(d, s, fs)
+        s_, fs_, t = descent_three_opt(d, s, fs, cand, params.pool)
     elif params.localsearch == "FIRSTIMP2":
-        s_, fs_, t = first_improvement_two_opt(d, s, fs)
+        s_, fs_, t = first_improvement_two_opt(d, s, fs, cand)
     elif params.localsearch == "FIRSTIMP3":
-        s_, fs_, t = first_improvement_three_opt(d, s, fs)
+        s_, fs_, t = first_improvement_three_opt(d, s, fs, cand)
+    elif params.localsearch == "DLB2":
+        s_, fs_, t = dlb_two_opt(d, s, fs, params.cand)
+    elif params.localsearch == "DLB3":
+        s_, fs_, t = dlb_three_opt(d, s, fs, params.cand)
+    elif params.localsearch == "LK":
+        s_, fs_, t = lin_kernighan(d, s, fs, params.cand)
     elif params.localsearch == "RANDOM*":
         s_, fs_, t = random_descent(d, s, fs, params.ls_max * len(d))
     elif params.localsearch == "RANDOM2":
@@ -311,5 +955,5 @@ def local_search(d, s, fs, params):
     elif params.localsearch == "RANDOM3":
         s_, fs_, t = random_descent_three_opt(d, s, fs, params.ls_max * len(d))
     elif params.localsearch == "VND*":
-        s_, fs_, t = vnd(d, s, fs, params.neigh_types)
+        s_, fs_, t = vnd(d, s, fs, params.neigh_types, params.cand, params.vnd_order, params.candidates > 0)
     return s_, fs_, t
@@ -1,7 +1,10 @@
 import tsp
 import util
+import candidates
 import random
 import metaheuristics
+import parallel
+import stats
 import mip
 import sys
 from params import Params
@@ -9,36 +12,70 @@ from params import Params
 
 def main(args):
     params = Params(args)         # read command line parameters
-    d, coord = util.read_tsp(params.instance)
+    if params.stats:
+        stats.enable()
+    if params.clear_cache:
+        util.clear_cache(params.cache_dir)
+    d, coord = util.read_tsp(params.instance, params.dtype, params.matrix_mb, params.oracle_cache_mb, params.cache_dir)
     if params.seed:
         random.seed(params.seed)  # change/remove to allow new random behavior (and solutions)
+    if params.algorithm not in ("FIXOPT", "MIP"):  # scanned by DLB, LK and TS (and by every search if -candidates)
+        with stats.phase("candidate lists"):
+            params.cand = candidates.knn(d, coord, params.candidates or candidates.K)
+    if params.constructive == "HILBERT" and len(coord) != len(d):
+        print("ERROR: The HILBERT constructive needs city coordinates (EXPLICIT instance without DISPLAY_DATA)!\n")
+        sys.exit(1)
     if params.timelimit is None:
         params.timelimit = len(d)
         print("Unspecified run time limit set to (num cities)", params.timelimit, "\n")
 
     # build initial solution
-    if params.constructive == "PARTGREEDY":
-        s_ini, fs_ini, t = tsp.part_greedy_build(d, params.alpha)
-    elif params.constructive == "GREEDY":
-        s_ini, fs_ini, t = tsp.greedy_build(d)
+    with stats.phase("construction"):
+        if params.constructive == "PARTGREEDY":
+            s_ini, fs_ini, t = tsp.part_greedy_build(d, params.alpha, params.cand)
+        elif params.constructive == "GREEDY":
+            s_ini, fs_ini, t = tsp.greedy_build(d, params.cand)
+        elif params.constructive == "INSERTION":
+            s_ini, fs_ini, t = tsp.insertion_build(d, "CHEAPEST")
+        elif params.constructive == "NEARINSERTION":
+            s_ini, fs_ini, t = tsp.insertion_build(d, "NEAREST")
+        elif params.constructive == "FARINSERTION":
+            s_ini, fs_ini, t = tsp.insertion_build(d, "FARTHEST")
+        elif params.constructive == "GREEDYEDGE":
+            s_ini, fs_ini, t = tsp.greedy_edge_build(d, params.cand or candidates.knn(d, coord, candidates.K))
+        elif params.constructive == "HILBERT":
+            s_ini, fs_ini, t = tsp.space_filling_curve_build(d, coord)
+        elif params.constructive == "MST":
+            s_ini, fs_ini, t = tsp.mst_build(d)
     print("Initial solution of cost: ", round(fs_ini, 2))
 
     # run selected algorithm
     print("Running", params.algorithm)
-    if params.algorithm == "GRASP":
-        s, fs, t, data = metaheuristics.grasp(d, params)
-    elif params.algorithm == "TS":
-        s, fs, t, data = metaheuristics.tabu_search(d, s_ini, fs_ini, params)
-    elif params.algorithm == "SA":
-        s, fs, t, data = metaheuristics.simulated_annealing(d, s_ini, fs_ini, params)
-    elif params.algorithm == "VNS":
-        s, fs, t, data = metaheuristics.vns(d, s_ini, fs_ini, params)
-    elif params.algorithm == "ILS":
-        s, fs, t, data = metaheuristics.ils(d, s_ini, fs_ini, params)
-    elif params.algorithm == "FIXOPT":
-        s, fs, t, data = mip.fix_opt(coord, d, s_ini, fs_ini, params)
-    elif params.algorithm == "MIP":
-        s, fs, t, data = mip.full_model(coord, d, s_ini, fs_ini, params)
+    if params.eval_workers > 1:  # processes evaluating the neighborhoods of TS and DESCENT2/DESCENT3
+        params.pool = parallel.NeighborhoodPool(d, params.eval_workers, params.cand)
+    try:
+        with stats.phase(params.algorithm):
+            if params.algorithm == "GRASP" and params.workers > 1:
+                s, fs, t, data = parallel.grasp(d, params)
+            elif params.algorithm == "GRASP":
+                s, fs, t, data = metaheuristics.grasp(d, params)
+            elif params.algorithm == "TS":
+                s, fs, t, data = metaheuristics.tabu_search(d, s_ini, fs_ini, params)
+            elif params.algorithm in ("SA", "ILS") and params.islands > 1:
+                s, fs, t, data = parallel.islands(d, s_ini, fs_ini, params)
+            elif params.algorithm == "SA":
+                s, fs, t, data = metaheuristics.simulated_annealing(d, s_ini, fs_ini, params)
+            elif params.algorithm == "VNS":
+                s, fs, t, data = metaheuristics.vns(d, s_ini, fs_ini, params)
+            elif params.algorithm == "ILS":
+                s, fs, t, data = metaheuristics.ils(d, s_ini, fs_ini, params)
+            elif params.algorithm == "FIXOPT":
+                s, fs, t, data = mip.fix_opt(coord, d, s_ini, fs_ini, params)
+            elif params.algorithm == "MIP":
+                s, fs, t, data = mip.full_model(coord, d, s_ini, fs_ini, params)
+    finally:
+        if params.pool is not None:
+            params.pool.close()
 
     # write outputs (if allowed)
     if params.chart:
@@ -46,6 +83,11 @@ def main(args):
     if params.output:
         util.plot_sol(s, coord, f'output/{params.instance} {params.algorithm} {params.seed}.html', title=f'{params.instance} {params.algorithm} {params.seed} Cost `{round(fs, 2)}')
 
+    if params.stats:
+        stats.dump(params.stats)
+        print()
+        stats.print_table()
+
     # needed to iRace
     print(round(fs, 2), end="")
 
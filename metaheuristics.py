@@ -1,249 +1,414 @@
 import tsp
+import distance
+import convergence
+import tabu
+import stats
 import local_search as ls
 import time
 import random
-import math
+import numpy as np
 
 
-def simulated_annealing(d, s, fs, params):
-    """Simulated Annealing https://www.science.org/doi/10.1126/science.220.4598.671"""
+SA_BLOCK = 1 << 16   # SA moves (and acceptance thresholds) drawn at once
+SA_VECTOR_GAP = 32   # SA moves are evaluated by NumPy chunks when fewer than 1 in SA_VECTOR_GAP is accepted
+
+
+def simulated_annealing(d, s, fs, params, board=None):
+    """Simulated Annealing https://www.science.org/doi/10.1126/science.220.4598.671
+    Random moves and acceptance thresholds are drawn in NumPy blocks and moves are applied in place
+    (an island of parallel.islands exchanges its best tour with the incumbent board)"""
     t_init = time.time()
-    chart_data = []
-    s_star = s[:]
+    trace = convergence.new_trace(params)
+    s = tsp.new_tour(s, params.tour_repr)
+    rng = np.random.default_rng(random.getrandbits(64))
+    s_star = s.copy()
     fs_star = fs  # best solution found so far
-    # t_0 = set_initial_temperature_sampling(d, s, fs)
-    # t_0 = set_initial_temperature_simulation(d, s, fs, sa_max)
+    with stats.phase("initial temperature"):
+        if params.sa_t_init == "SAMPLING":
+            t_0 = set_initial_temperature_sampling(d, s, fs, rng=rng)
+        elif params.sa_t_init == "SIMULATION":
+            t_0 = set_initial_temperature_simulation(d, s, fs, params.sa_max * len(d), params.sa_t_0, rng=rng)
+        else:
+            t_0 = params.sa_t_0
+    if params.verbose:
+        print(f'Initial temperature: {t_0:.3f}')
+    it = 0  # moves evaluated
     while time.time() - t_init < params.timelimit:
-        iter_t = 0    # iterations at temperature t
-        t = params.sa_t_0       # current temperature
+        t = t_0       # current temperature
         while t > 0.001:
             if params.verbose:
-                print(f'| temp: {t:10.3f}  |  s: {fs:10.3f}  |  s*: {fs_star:10.3f}  |  time: {time.time() - t_init:10.2f} |')
+                print(f'| temp: {t:10.3f}  |  s: {fs:10.3f}  |  s*: {fs_star:10.3f}  |  time: {time.time() - t_init:10.2f} '
+                      f'|  moves/s: {it / max(time.time() - t_init, 1e-9):10.0f} |')
+            iter_t = 0    # iterations at temperature t
             while iter_t < params.sa_max * len(d):
-                iter_t += 1
-                N = ls.get_random_neighbor(d, fs, s)
-                delta = N[0][0] - fs
-                if delta < 0:
-                    s, fs = tsp.move_to_neighbor(N, d, fs, s)
-                    if fs < fs_star:
-                        s_star = s[:]
-                        fs_star = fs
-                else:
-                    x = random.random()  # generates a random float number between 0 and 1
-                    if x < math.exp(-delta/t):  # move to a worsening neighbor
-                        s, fs = tsp.move_to_neighbor(N, d, fs, s)
-            chart_data.append([time.time() - t_init, fs, fs_star])
+                size = min(SA_BLOCK, params.sa_max * len(d) - iter_t)
+                with stats.phase("annealing"):
+                    if isinstance(s, tsp.Tour):
+                        s, fs, s_star, fs_star = anneal_tour(d, s, fs, s_star, fs_star, t, size, rng)
+                    else:  # city-based 2-opt and Or-opt moves
+                        s, fs, s_star, fs_star = anneal_city(d, s, fs, s_star, fs_star, t, size, rng)
+                iter_t += size
+                if board is not None and board.due():
+                    with stats.phase("migration"):
+                        m = board.exchange(s_star, fs_star)
+                        if m is not None:  # migration: continue from the best tour of the islands
+                            s, fs = tsp.new_tour(m[0], params.tour_repr), m[1]
+                            s_star, fs_star = s.copy(), fs
+            it += iter_t
+            trace.add(time.time() - t_init, fs, fs_star)
             t = params.sa_alpha * t
-            iter_t = 0
-    return s_star, fs_star, time.time() - t_init, chart_data
+    if params.verbose:
+        print(f'{it} moves evaluated ({it / max(time.time() - t_init, 1e-9):.0f} moves/s)')
+    return tsp.tour_list(s_star), fs_star, time.time() - t_init, trace.close()
 
 
-def set_initial_temperature_simulation(d, s, fs, sa_max, t_0=100, beta=1.15, gama=0.90):
-    """Defines initial temperature by simulation"""
-    t = t_0       # current temperature
-    flag = True
-    while flag:
-        accepted = 0
-        for iter_t in range(sa_max):
-            N = ls.get_random_neighbor(d, fs, s)
-            delta = N[0][0] - fs
-            if delta < 0:
-                accepted += 1
-            else:
-                x = random.random()
-                if x < math.exp(-delta/t):
+def anneal_tour(d, s, fs, s_star, fs_star, t, size, rng):
+    """size SA iterations at temperature t on a Tour (random 2-opt and 3-opt moves, 50% odd each)
+    While moves are often accepted they are evaluated one by one; otherwise a chunk of the next moves is evaluated at
+    once by NumPy and the first accepted one is applied (the moves before it were evaluated on the current tour)"""
+    a = d if isinstance(d, distance.Oracle) else distance.as_array(d)
+    M = sa_random_moves(rng, len(s) - 1, size)
+    thr = -t * np.log(1.0 - rng.random(size))  # Metropolis: x < exp(-delta / t) <=> delta < -t * ln(x)
+    gap = 1.0  # moving average of the number of moves evaluated per accepted move
+    r = 0
+    while r < size:
+        if gap < SA_VECTOR_GAP:
+            e = min(size, r + SA_VECTOR_GAP)
+            accepted = 0
+            for (i, j, k), x in zip(M[r:e].tolist(), thr[r:e].tolist()):
+                fs_ = tsp.three_opt(d, s, fs, i, j, k) if k else tsp.two_opt(d, s, fs, i, j)
+                if fs_ - fs < x:
                     accepted += 1
-        if accepted >= gama * sa_max:
-            flag = False
+                    s, fs = tsp.three_opt_move(d, s, fs, i, j, k) if k else tsp.two_opt_move(d, s, fs, i, j)
+                    if fs < fs_star:
+                        s_star = s.copy()
+                        fs_star = fs
+            gap = (gap + (e - r) / max(accepted, 0.5)) / 2
+            r = e
         else:
-            t = beta * t
-    return t
+            e = min(size, r + 2 * int(gap))
+            delta = sa_deltas(a, s.t_view, M[r:e], counted=False)
+            acc = np.flatnonzero(delta < thr[r:e])
+            if len(acc) == 0:
+                if stats.ENABLED:
+                    count_sa_moves(M[r:e], delta)
+                gap = (gap + 2 * (e - r)) / 2
+                r = e
+                continue
+            q = r + int(acc[0])
+            if stats.ENABLED:  # the moves after the accepted one are evaluated again in the next chunk
+                count_sa_moves(M[r:q + 1], delta[:q - r + 1])
+            i, j, k = M[q].tolist()
+            s, fs = tsp.three_opt_move(d, s, fs, i, j, k) if k else tsp.two_opt_move(d, s, fs, i, j)
+            if fs < fs_star:
+                s_star = s.copy()
+                fs_star = fs
+            gap = (gap + q - r + 1) / 2
+            r = q + 1
+    return s, fs, s_star, fs_star
+
+
+def anneal_city(d, s, fs, s_star, fs_star, t, size, rng):
+    """size SA iterations at temperature t on a tour given by next/prev (random 2-opt and Or-opt city moves)"""
+    for x in (-t * np.log(1.0 - rng.random(size))).tolist():
+        N = ls.get_random_city_neighbor(d, fs, s)
+        if N[0][0] - fs < x:
+            s, fs = tsp.move_to_city_neighbor(N, d, fs, s)
+            if fs < fs_star:
+                s_star = s.copy()
+                fs_star = fs
+    return s, fs, s_star, fs_star
 
 
-def set_initial_temperature_sampling(d, s, fs, n_neighbors=100):
-    """Defines initial temperature by sampling"""
-    t = 0
-    for i in range(n_neighbors):
-        N = ls.get_random_neighbor(d, fs, s)
-        delta = fs - N[0][0]
-        if math.fabs(delta) > t:
-            t = math.fabs(delta)
+def sa_random_moves(rng, n, size):
+    """Random moves as rows (i, j, k) of indexes 1...n-1 drawn as ls.get_random_neighbor does: 2-opt moves (k = 0)
+    and 3-opt moves (i < j < k) with 50% odd each"""
+    P = rng.integers(1, n, size=(size, 3))
+    bad = (P[:, 0] == P[:, 1]) | (P[:, 0] == P[:, 2]) | (P[:, 1] == P[:, 2])
+    while bad.any():
+        P[bad] = rng.integers(1, n, size=(int(bad.sum()), 3))
+        bad = (P[:, 0] == P[:, 1]) | (P[:, 0] == P[:, 2]) | (P[:, 1] == P[:, 2])
+    M = np.sort(P, axis=1)
+    two = rng.random(size) < 0.5
+    M[two, 0] = np.minimum(P[two, 0], P[two, 1])
+    M[two, 1] = np.maximum(P[two, 0], P[two, 1])
+    M[two, 2] = 0
+    return M
+
+
+def sa_deltas(a, t, M, counted=True):
+    """Cost variations of the moves of sa_random_moves on tour t (NumPy array), evaluated at once
+    (counted by the instrumentation unless counted is False: the caller then counts the moves it used)"""
+    i, j, k = M[:, 0], M[:, 1], M[:, 2]
+    two_opt_deltas = tsp.two_opt_deltas if counted else stats.kernel("two_opt_deltas")
+    three_opt_deltas = tsp.three_opt_deltas if counted else stats.kernel("three_opt_deltas")
+    two = k == 0
+    delta = np.empty(len(M))
+    delta[two] = two_opt_deltas(a, t, i[two] - 1, j[two])
+    three = ~two
+    delta[three] = three_opt_deltas(a, t, i[three], j[three], k[three])
+    return delta
+
+
+def count_sa_moves(M, delta):
+    """Count the moves of sa_random_moves evaluated by sa_deltas (with their cost variations delta) as 2-opt and 3-opt
+    evaluations of the instrumentation"""
+    two = M[:, 2] == 0
+    improving = delta < -stats.EPS
+    stats.count("2opt", int(np.count_nonzero(two)), int(np.count_nonzero(improving & two)))
+    stats.count("3opt", int(np.count_nonzero(~two)), int(np.count_nonzero(improving & ~two)))
+
+
+def sample_deltas(d, s, size, rng):
+    """Cost variations of size random 2-opt and 3-opt moves of s (any tour representation)"""
+    a = d if isinstance(d, distance.Oracle) else distance.as_array(d)
+    t = s.t_view if isinstance(s, tsp.Tour) else np.array(tsp.tour_list(s))
+    return sa_deltas(a, t, sa_random_moves(rng, len(t) - 1, size))
+
+
+def set_initial_temperature_simulation(d, s, fs, sa_max, t_0=100, beta=1.15, gama=0.90, rng=None):
+    """Defines initial temperature by simulation: raised until a fraction gama of sa_max random neighbors is accepted
+    (neighbors evaluated at once by NumPy)"""
+    rng = rng or np.random.default_rng(random.getrandbits(64))
+    size = min(sa_max, SA_BLOCK)
+    delta = sample_deltas(d, s, size, rng)
+    x = rng.random(size)
+    t = t_0       # current temperature
+    while np.count_nonzero((delta < 0) | (x < np.exp(-np.maximum(delta, 0) / t))) < gama * size:
+        t = beta * t
     return t
 
 
-def ils(d, s, fs, params):
-    """Iterated Local Search https://doi.org/10.1007/BF01096763"""
+def set_initial_temperature_sampling(d, s, fs, n_neighbors=100, rng=None):
+    """Defines initial temperature by sampling: the largest cost variation among random neighbors"""
+    rng = rng or np.random.default_rng(random.getrandbits(64))
+    return float(np.max(np.abs(sample_deltas(d, s, n_neighbors, rng))))
+
+
+def ils(d, s, fs, params, board=None):
+    """Iterated Local Search https://doi.org/10.1007/BF01096763
+    (an island of parallel.islands exchanges its best tour with the incumbent board)"""
     t_init = time.time()
-    chart_data = []
-    chart_data.append([time.time() - t_init, fs, fs])
-    s, fs, t = ls.local_search(d, s, fs, params)
-    chart_data.append([time.time() - t_init, fs, fs])
+    trace = convergence.new_trace(params)
+    trace.add(time.time() - t_init, fs, fs)
+    with stats.phase("local search"):
+        s, fs, t = ls.local_search(d, tsp.new_tour(s, params.tour_repr), fs, params)
+    linked = isinstance(s, tsp.TwoLevelList)
+    trace.add(time.time() - t_init, fs, fs)
     it = 0
     while time.time() - t_init < params.timelimit:
         it += 1
-        s_ = s[:]
+        with stats.phase("copy"):
+            s_ = s.copy()
         fs_ = fs
         # perturbation
-        for _ in range(params.ils_p_level):  # perturbation: apply p_level 2-opt random moves to s_
-            N = ls.get_two_opt_random_neighbor(d, s_, fs_)
-            s_, fs_ = tsp.two_opt_move(d, s_, fs_, N[0][1], N[0][2])
-        chart_data.append([time.time() - t_init, fs_, fs])
+        with stats.phase("perturbation"):
+            for _ in range(params.ils_p_level):  # perturbation: apply p_level 2-opt random moves to s_
+                if linked:
+                    N = ls.get_two_opt_random_city_neighbor(d, s_, fs_)
+                    s_, fs_ = tsp.two_opt_city_move(d, s_, fs_, N[0][1], N[0][2])
+                else:
+                    N = ls.get_two_opt_random_neighbor(d, s_, fs_)
+                    s_, fs_ = tsp.two_opt_move(d, s_, fs_, N[0][1], N[0][2])
+        trace.add(time.time() - t_init, fs_, fs)
         # local search
-        s__, fs__, t = ls.local_search(d, s_, fs_, params)
+        with stats.phase("local search"):
+            s__, fs__, t = ls.local_search(d, s_, fs_, params)
         # acceptance condition
         if fs__ < fs:
-            s = s__[:]
+            s = s__
             fs = fs__
+        if board is not None and board.due():
+            with stats.phase("migration"):
+                m = board.exchange(s, fs)
+                if m is not None:  # migration: continue from the best tour of the islands
+                    s, fs = tsp.new_tour(m[0], params.tour_repr), m[1]
         if params.verbose:
             print(f'| it: {it:6d}  |  s_: {fs_:10.2f}  |  s__: {fs__:10.2f}  |  s*: {fs:10.2f}  |  time: {time.time() - t_init:10.2f} |')
-        chart_data.append([time.time() - t_init, fs__, fs])
-    return s, fs, time.time() - t_init, chart_data
+        trace.add(time.time() - t_init, fs__, fs)
+    return tsp.tour_list(s), fs, time.time() - t_init, trace.close()
 
 
 def vns(d, s_ini, fs_ini, params):
     """Variable Neighborhood Search (uses 1st improvement VND local search) https://doi.org/10.1007/BF01096763"""
     t_init = time.time()
-    chart_data = []
-    s = s_ini[:]
+    trace = convergence.new_trace(params)
+    s = tsp.Tour(s_ini)
     fs = fs_ini
     it = 0
     while time.time() - t_init < params.timelimit:
         it += 1
         k = 1
         while k <= params.vns_k_max:
-            if k == 1:  # move to random 2-opt neighbor
-                N = ls.get_two_opt_random_neighbor(d, s, fs)
-                s_, fs_ = tsp.two_opt_move(d, s[:], fs, N[0][1], N[0][2])
-            elif k == 2:  # move to random 3-opt neighbor
-                N = ls.get_three_opt_random_neighbor(d, s, fs)
-                s_, fs_ = tsp.three_opt_move(d, s[:], fs, N[0][1], N[0][2], N[0][3])
-            chart_data.append([time.time() - t_init, fs_, fs])
+            with stats.phase("shaking"):
+                if k == 1:  # move to random 2-opt neighbor
+                    N = ls.get_two_opt_random_neighbor(d, s, fs)
+                    s_, fs_ = tsp.two_opt_move(d, s.copy(), fs, N[0][1], N[0][2])
+                elif k == 2:  # move to random 3-opt neighbor
+                    N = ls.get_three_opt_random_neighbor(d, s, fs)
+                    s_, fs_ = tsp.three_opt_move(d, s.copy(), fs, N[0][1], N[0][2], N[0][3])
+            trace.add(time.time() - t_init, fs_, fs)
             # local search
-            s__, fs__, t = ls.local_search(d, s_, fs_, params)
+            with stats.phase("local search"):
+                s__, fs__, t = ls.local_search(d, s_, fs_, params)
             if fs__ + ls.EPS < fs:
-                s = s__[:]
+                s = s__
                 fs = fs__
                 k = 1
             else:
                 k = k + 1
             if params.verbose:
                 print(f'| it: {it:6d}  |  k: {k:3d}  |  s_: {fs_:10.2f}  |  s__: {fs__:10.2f}  |  s*: {fs:10.2f}  |  time: {time.time() - t_init:10.2f} |')
-            chart_data.append([time.time() - t_init, fs__, fs])
-    return s, fs, time.time() - t_init, chart_data
+            trace.add(time.time() - t_init, fs__, fs)
+    return tsp.tour_list(s), fs, time.time() - t_init, trace.close()
 
 
 def tabu_search(d, s, fs, params):
     """Tabu Search https://link.springer.com/chapter/10.1007/978-1-4613-0303-9_33"""
     t_init = time.time()
-    chart_data = []
-    s_star = s[:]
+    trace = convergence.new_trace(params)
+    s = tsp.Tour(s)
+    s_star = s.copy()
     fs_star = fs
-    T = []  # tabu list
+    T = tabu.TabuMemory(params.tabu_max or max(1, len(d) // 5))  # tabu edges (EDGE) or hashes of visited tours (SOLN)
     it = 0
     while time.time() - t_init < params.timelimit:
         it += 1
-        s, fs, m = tabu_neighbor(d, s, fs, fs_star, T)
-        # s, fs, m = tabu_soln(d, s, fs, fs_star, T)
-        T.append(m)
-        # T.append(s)
-        if len(T) > params.tabu_max:
-            T.pop(0)
-        if fs < fs_star:
-            s_star = s[:]
-            fs_star = fs
+        with stats.phase("neighborhood"):
+            if params.tabu_mode == "SOLN":
+                s, fs, m = tabu_soln(d, s, fs, fs_star, T, params.cand)
+            else:
+                s, fs, m = tabu_neighbor(d, s, fs, fs_star, T, params.cand, params.pool)
+        with stats.phase("update"):
+            T.next_iteration()
+            if fs < fs_star:
+                s_star = s.copy()
+                fs_star = fs
         if params.verbose:
             print(f'| it: {it:6d}  |  s: {fs:10.2f}  |  s*: {fs_star:10.2f}  |  time: {time.time() - t_init:10.2f} |')
-        chart_data.append([time.time() - t_init, fs, fs_star])
-    return s_star, fs_star, time.time() - t_init, chart_data
+        trace.add(time.time() - t_init, fs, fs_star)
+    return tsp.tour_list(s_star), fs_star, time.time() - t_init, trace.close()
 
 
-def tabu_soln(d, s, fs, fs_star, T):
-    """Move to the best non Tabu neighbor"""
+def tabu_soln(d, s, fs, fs_star, T, cand=None):
+    """Move to the best neighbor not visited in the last iterations (tours compared by the hash of their edges)"""
     V = []
+    m = None
     best_fs = float("inf")
-    # 2-opt neighbors
+    h = tabu.tour_hash(s)
+    T.add_solution(h)
+    eh = tabu.edge_hash
+    # 2-opt neighbors (hash of the neighbor updated in O(1) from the removed and added edges)
     for i in range(1, len(s) - 1):
         for j in range(i + 1, len(s) - 1):
             if not (i == 1 and j == len(d) - 1):  # to avoid needless iterations
-                m = (i, j)
                 fs_ = tsp.two_opt(d, s, fs, i, j)
                 if fs_ < best_fs:
-                    s_, fs_ = tsp.two_opt_move(d, s[:], fs, i, j)
-                    if s_ not in T:
+                    h_ = h ^ eh(s[i - 1], s[i]) ^ eh(s[j], s[j + 1]) ^ eh(s[i - 1], s[j]) ^ eh(s[i], s[j + 1])
+                    if not T.is_tabu_solution(h_):
                         best_fs = fs_
                         V.append([fs_, i, j])
-    # 3-opt neighbors
-    for i in range(1, len(s) - 1):
-        for j in range(i + 1, len(s) - 1):
-            for k in range(j + 1, len(s) - 1):
-                m = (i, j, k)
-                fs_ = tsp.three_opt(d, s, fs, i, j, k)
-                if fs_ < best_fs:
-                    s_, fs_ = tsp.three_opt_move(d, s[:], fs, i, j, k)
-                    if s_ not in T:
-                        best_fs = fs_
-                        V.append([fs_, i, j, k])
+    # 3-opt neighbors (hash updated in O(1) the same way, from the edges of the reconnection three_opt picks)
+    for (i, j, k) in three_opt_neighborhood(d, s, cand):
+        fs_ = tsp.three_opt(d, s, fs, i, j, k)
+        if fs_ < best_fs:
+            removed, added = tsp.three_opt_edges(d, s, fs, i, j, k)
+            h_ = h
+            for a, b in removed + added:
+                h_ ^= eh(a, b)
+            if not T.is_tabu_solution(h_):
+                best_fs = fs_
+                V.append([fs_, i, j, k])
     if V:
-        if len(V[-1]) == 3:  # move to 2-opt best neighbor
-            i, j = V[-1][1], V[-1][2]
-            m = (i, j)
-            s, fs = tsp.two_opt_move(d, s, fs, i, j)
-        elif len(V[-1]) == 4:  # move to 3-opt best neighbor
-            i, j, k = V[-1][1], V[-1][2], V[-1][3]
-            m = (i, j, k)
-            s, fs = tsp.three_opt_move(d, s, fs, i, j, k)
+        s, fs, m = move_to_tabu_neighbor(d, s, fs, V[-1])
     return s, fs, m
 
 
-def tabu_neighbor(d, s, fs, fs_star, T):
-    """Move to the best non Tabu neighbor"""
+def tabu_neighbor(d, s, fs, fs_star, T, cand=None, pool=None):
+    """Move to the best non Tabu neighbor: a move is tabu if it removes 2 or more edges added in the last iterations
+    (3-opt moves built sequentially from candidate edges if cand lists are given; the neighborhoods are split among
+    the processes of a parallel.NeighborhoodPool if one is given)"""
     V = []
     best_fs = float("inf")
+    mask = T.edge_mask(s)
+    tabu_edges = mask.tolist()  # tabu_edges[x]: edge (s[x], s[x+1]) is tabu
     # 2-opt neighbors
-    for i in range(1, len(s) - 1):
-        for j in range(i + 1, len(s) - 1):
-            if not (i == 1 and j == len(d) - 1):  # to avoid needless iterations
-                m = (i, j)
-                fs_ = tsp.two_opt(d, s, fs, i, j)
-                if fs_ < best_fs and (m not in T or fs_ < fs_star):
-                    best_fs = fs_
-                    V.append([fs_, i, j])
+    if not isinstance(d, distance.Oracle):  # whole neighborhood evaluated by NumPy
+        if pool is not None:
+            n = pool.best_two_opt_move(s, fs, mask, fs_star)
+        else:
+            n = ls.best_two_opt_move(d, s, fs, tabu=mask, fs_star=fs_star)
+        if n is not None:
+            best_fs = n[0]
+            V.append(list(n))
+    else:
+        for i in range(1, len(s) - 1):
+            for j in range(i + 1, len(s) - 1):
+                if not (i == 1 and j == len(d) - 1):  # to avoid needless iterations
+                    fs_ = tsp.two_opt(d, s, fs, i, j)
+                    if fs_ < best_fs and (not (tabu_edges[i - 1] and tabu_edges[j]) or fs_ < fs_star):
+                        best_fs = fs_
+                        V.append([fs_, i, j])
     # 3-opt neighbors
-    for i in range(1, len(s) - 1):
-        for j in range(i + 1, len(s) - 1):
-            for k in range(j + 1, len(s) - 1):
-                m = (i, j, k)
-                fs_ = tsp.three_opt(d, s, fs, i, j, k)
-                if fs_ < best_fs and (not three_opt_is_tabu(m, T) or fs_ < fs_star):
-                    best_fs = fs_
-                    V.append([fs_, i, j, k])
+    if pool is not None and cand is not None:
+        n = pool.best_three_opt_move(s, fs, mask, fs_star)
+        if n is not None and n[0] < best_fs:
+            V.append(list(n))
+    else:
+        for m in three_opt_neighborhood(d, s, cand):
+            fs_ = tsp.three_opt(d, s, fs, m[0], m[1], m[2])
+            if fs_ < best_fs and (not three_opt_is_tabu(m, tabu_edges) or fs_ < fs_star):
+                best_fs = fs_
+                V.append([fs_, m[0], m[1], m[2]])
+    m = None
     if V:
-        if len(V[-1]) == 3:  # move to 2-opt best neighbor
-            i, j = V[-1][1], V[-1][2]
-            m = (i, j)
-            s, fs = tsp.two_opt_move(d, s, fs, i, j)
-        elif len(V[-1]) == 4:  # move to 3-opt best neighbor
-            i, j, k = V[-1][1], V[-1][2], V[-1][3]
-            m = (i, j, k)
-            s, fs = tsp.three_opt_move(d, s, fs, i, j, k)
+        # the edges added by the move may not be removed in the next iterations
+        ends = removed_edges_cities(s, V[-1])
+        before = tabu.incident_edges(s, ends)
+        s, fs, m = move_to_tabu_neighbor(d, s, fs, V[-1])
+        T.add_edges(tabu.incident_edges(s, ends) - before)
     return s, fs, m
 
 
-def three_opt_is_tabu(m, T):
+def three_opt_neighborhood(d, s, cand=None):
+    """3-opt moves (i, j, k) built sequentially from candidate edges (O(n k^2) moves) if cand lists are given,
+    otherwise all the moves"""
+    if cand is not None:
+        pos = tsp.positions(s)
+        seen = set()  # a move is usually reached from several of its edges
+        for p in range(len(s) - 1):
+            for m in ls.three_opt_candidate_moves(d, s, pos, cand, p):
+                if m not in seen:
+                    seen.add(m)
+                    yield m
+    else:
+        for i in range(1, len(s) - 1):
+            for j in range(i + 1, len(s) - 1):
+                for k in range(j + 1, len(s) - 1):
+                    yield i, j, k
+
+
+def move_to_tabu_neighbor(d, s, fs, v):
+    """Move to neighbor v: [fs, i, j] (2-opt) or [fs, i, j, k] (3-opt)"""
+    if len(v) == 3:  # move to 2-opt best neighbor
+        m = (v[1], v[2])
+        s, fs = tsp.two_opt_move(d, s, fs, v[1], v[2])
+    else:  # move to 3-opt best neighbor
+        m = (v[1], v[2], v[3])
+        s, fs = tsp.three_opt_move(d, s, fs, v[1], v[2], v[3])
+    return s, fs, m
+
+
+def removed_edges_cities(s, v):
+    """Cities at the ends of the edges removed by neighbor v: [fs, i, j] (2-opt) or [fs, i, j, k] (3-opt)"""
+    edges = (v[1] - 1, v[2]) if len(v) == 3 else (v[1], v[2], v[3])
+    return {c for x in edges for c in (s[x], s[x + 1])}
+
+
+def three_opt_is_tabu(m, tabu_edges):
     """Determinate whether a 3-opt move is tabu
-    It cannot have 2 or more indexes in common with any tabu move"""
-    for t in T:
-        if len(t) == 3:
-            count = 0
-            if m[0] in t:
-                count += 1
-            if m[1] in t:
-                count += 1
-            if m[2] in t:
-                count += 1
-            if count >= 2:
-                return True
-    return False
+    It cannot remove 2 or more tabu edges (tabu_edges[x]: edge (s[x], s[x+1]) is tabu)"""
+    return tabu_edges[m[0]] + tabu_edges[m[1]] + tabu_edges[m[2]] >= 2
 
 
 def grasp(d, params):
@@ -251,19 +416,22 @@ def grasp(d, params):
     t_init = time.time()
     fs_star = float("inf")
     it = 0
-    chart_data = []
+    trace = convergence.new_trace(params)
     while time.time() - t_init < params.timelimit:
         it += 1
-        s_ini, fs_ini, t = tsp.part_greedy_build(d, params.grasp_alpha)
+        with stats.phase("construction"):
+            s_ini, fs_ini, t = tsp.part_greedy_build(d, params.grasp_alpha, params.cand)
         if fs_ini < fs_star:
             fs_star = fs_ini
-        chart_data.append([time.time() - t_init, fs_ini, fs_star])
-        s, fs, t = ls.vnd_first_improvement(d, s_ini[:], fs_ini, ls.MAX_K)
+        trace.add(time.time() - t_init, fs_ini, fs_star)
+        with stats.phase("local search"):
+            s, fs, t = ls.vnd_first_improvement(d, tsp.Tour(s_ini), fs_ini, ls.MAX_K, params.cand, params.vnd_order,
+                                                 params.candidates > 0)
         if params.verbose:
             print(f'| it: {it:6d}  |  s_ini: {fs_ini:10.2f}  |  s: {fs:10.2f}  |  s*: {fs_star:10.2f}  |  time: {time.time() - t_init:10.2f} |')
         if fs < fs_star:
             fs_star = fs
-            s_star = s[:]
-        chart_data.append([time.time() - t_init, fs, fs_star])
+            s_star = s.copy()
+        trace.add(time.time() - t_init, fs, fs_star)
 
-    return s_star, fs_star, time.time() - t_init, chart_data
+    return tsp.tour_list(s_star), fs_star, time.time() - t_init, trace.close()
@@ -4,7 +4,9 @@ from itertools import combinations
 import gurobipy as gp
 from gurobipy import GRB
 import random
+import numpy as np
 import local_search as ls
+import distance
 
 # Based on Gurobi code on Mixed-Integer Programming heuristics: https://github.com/Gurobi/pres-mipheur
 def tspmip(n, dist, timelimit=60):
@@ -135,7 +137,14 @@ def tspcb(heurcb=None):
     return basecb  # the generated function
 
 
-def dist_from_coord(coord):
+def dist_from_coord(coord, d=None):
+    """"Dictionary of distances between each pair of points (i > j)
+    If the distance matrix d is given, it is reused instead of recomputing distances from coord"""
+    if d is not None and not isinstance(d, distance.Oracle):
+        a = distance.as_array(d)
+        rows, cols = np.tril_indices(len(a), -1)
+        return dict(zip(zip(rows.tolist(), cols.tolist()), a[rows, cols].tolist()))
+
     points = []
     for (i, x, y) in coord:
         points.append((x, y))
@@ -178,7 +187,7 @@ def convert_soln(m):
 def full_model(coord, d, s_ini, fs_ini, params):
     chart_data = [[0, fs_ini, fs_ini]]
     n = len(coord)
-    dist = dist_from_coord(coord)
+    dist = dist_from_coord(coord, d)
     m = tspmip(n, dist, params.timelimit)
     s_ini, fs_ini, t = ls.local_search(d, s_ini, fs_ini, params)
     load_soln(s_ini, m)
@@ -192,7 +201,7 @@ def full_model(coord, d, s_ini, fs_ini, params):
 def fix_opt(coord, d, s_ini, fs_ini, params):
     chart_data = [[0, fs_ini, fs_ini]]
     n = len(coord)
-    dist = dist_from_coord(coord)
+    dist = dist_from_coord(coord, d)
     m = tspmip(n, dist, params.fix_opt_it_tl)
     m.Params.LogToConsole = 0  # deactivate Gurobi logs
     s_ini, fs_ini, t = ls.local_search(d, s_ini, fs_ini, params)
@@ -339,7 +348,7 @@ class pytsp:
 # def run_all(dataset):
 #     # load problem data
 #     d, coord = util.read_tsp(dataset)
-#     dist = dist_from_coord(coord)
+#     dist = dist_from_coord(coord, d)
 #     n = len(coord)
 #
 #     # ## Generate model and solve with basic callback
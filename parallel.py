@@ -0,0 +1,252 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import random
+import time
+import numpy as np
+import convergence
+import distance
+import local_search as ls
+import metaheuristics
+import tsp
+
+
+# state of a worker process, set once by init_worker
+_d = None       # distance matrix (attached to the shared memory block of the main process)
+_params = None
+_board = None   # incumbent board of the island model
+_shm = []       # shared memory blocks kept open while the worker lives
+
+
+def share_matrix(d):
+    """"Copy a distance matrix to a new shared memory block, so worker processes read it without copies
+    Returns the block (to be released by the caller) and the spec given to attach_matrix; an oracle only holds
+    coordinates and is sent as is (no block)"""
+    if not isinstance(d, distance.Matrix):
+        return None, d
+    a = d.array
+    shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+    np.ndarray(a.shape, a.dtype, buffer=shm.buf)[:] = a
+    return shm, (shm.name, a.shape, a.dtype.str)
+
+
+def attach_matrix(spec):
+    """"Distance matrix of a worker process from the spec returned by share_matrix (zero copy)"""
+    if not isinstance(spec, tuple):
+        return spec
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    _shm.append(shm)
+    return distance.Matrix(np.ndarray(shape, np.dtype(dtype), buffer=shm.buf))
+
+
+def init_worker(spec, params, board=None):
+    """"Initializer of the worker processes: attach the shared distance matrix (each worker streams its trace to a
+    file of its own)"""
+    global _d, _params, _board
+    _d = attach_matrix(spec)
+    params.trace_file = convergence.process_file(params.trace_file)
+    _params = params
+    _board = board
+
+
+def seeds(seed, n):
+    """"n independent seeds derived from seed (fresh entropy if seed is None) for the random streams of the workers"""
+    return [int(ss.generate_state(1)[0]) for ss in np.random.SeedSequence(seed).spawn(n)]
+
+
+def run_workers(d, params, worker, args, board=None):
+    """"Run worker(*a) for each a in args in a pool of len(args) processes sharing the distance matrix d"""
+    shm, spec = share_matrix(d)
+    try:
+        with mp.Pool(len(args), initializer=init_worker, initargs=(spec, params, board)) as pool:
+            return pool.starmap(worker, args)
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+def merge_chart_data(runs):
+    """"Chart data of parallel runs (traces) merged by time as an array: [time, fs of the run, best fs among all runs
+    so far]"""
+    merged = np.vstack([np.asarray(data, dtype=np.float64).reshape(-1, 3) for data in runs])
+    merged = merged[np.lexsort((merged[:, 2], merged[:, 1], merged[:, 0]))]
+    merged[:, 2] = np.minimum.accumulate(merged[:, 2])
+    return merged
+
+
+def best_run(t_init, results):
+    """"Global best tour among the results (s, fs, chart_data) of the workers, along with the merged chart data"""
+    s_star, fs_star, _ = min(results, key=lambda r: r[1])
+    return s_star, fs_star, time.time() - t_init, merge_chart_data([r[2] for r in results])
+
+
+# ================================================ parallel GRASP ======================================================
+def grasp_worker(seed):
+    """"GRASP iterations of a worker process for the time limit, with its own random stream"""
+    random.seed(seed)
+    s, fs, t, data = metaheuristics.grasp(_d, _params)
+    return tsp.tour_list(s), fs, data
+
+
+def grasp(d, params):
+    """"GRASP with its (independent) iterations run by params.workers processes for the time limit
+    The distance matrix is placed in shared memory once; the best tour of all workers is returned"""
+    t_init = time.time()
+    results = run_workers(d, params, grasp_worker, [(x,) for x in seeds(params.seed, params.workers)])
+    return best_run(t_init, results)
+
+
+# ============================================== island model (ILS, SA) ================================================
+class Board:
+    """"Incumbent board of the island model: the best tour posted by the islands and its cost, stored in a shared
+    memory block (cost as float64, then the closed tour as int32) guarded by a lock"""
+
+    def __init__(self, n, period, name=None, lock=None):
+        self.n = n
+        self.period = period  # seconds between two exchanges of an island
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=8 + 4 * (n + 1))
+        self.lock = lock if lock is not None else mp.Lock()
+        self.cost = np.ndarray(1, np.float64, buffer=self.shm.buf)
+        self.tour = np.ndarray(n + 1, np.int32, buffer=self.shm.buf, offset=8)
+        if name is None:
+            self.cost[0] = np.inf
+        self.last = time.time()
+
+    def __reduce__(self):
+        return Board, (self.n, self.period, self.shm.name, self.lock)
+
+    def due(self):
+        """"True once every period seconds (time for the island to exchange its best tour)"""
+        now = time.time()
+        if now - self.last < self.period:
+            return False
+        self.last = now
+        return True
+
+    def exchange(self, s, fs):
+        """"Post tour s of cost fs if it beats the board; returns the board's tour and cost if they beat fs
+        (the migrant the island continues from), otherwise None"""
+        with self.lock:
+            if fs < self.cost[0]:
+                self.tour[:] = tsp.tour_list(s)
+                self.cost[0] = fs
+            elif self.cost[0] < fs:
+                return self.tour.tolist(), float(self.cost[0])
+        return None
+
+    def release(self):
+        """"Free the shared memory block (by the process that created the board)"""
+        del self.cost, self.tour
+        self.shm.close()
+        self.shm.unlink()
+
+
+def island_worker(seed, s, fs):
+    """"ILS or SA run of an island for the time limit, with its own random stream and exchanges with the board"""
+    random.seed(seed)
+    run = metaheuristics.simulated_annealing if _params.algorithm == "SA" else metaheuristics.ils
+    s, fs, t, data = run(_d, s, fs, _params, _board)
+    return tsp.tour_list(s), fs, data
+
+
+def islands(d, s, fs, params):
+    """"Island model: params.islands copies of ILS or SA started from s in separate processes with different seeds
+    Every params.migration seconds each island posts its best tour to the shared incumbent board and continues from
+    the board's tour when it is better; the best tour of all islands and the merged chart data are returned"""
+    t_init = time.time()
+    board = Board(len(d), params.migration)
+    try:
+        results = run_workers(d, params, island_worker, [(x, s, fs) for x in seeds(params.seed, params.islands)], board)
+    finally:
+        board.release()
+    return best_run(t_init, results)
+
+
+# ======================================== parallel neighborhood evaluation ============================================
+_tour = None    # current tour and tabu edges written by NeighborhoodPool (shared memory views)
+_tabu = None
+_cand = None
+
+
+def init_evaluator(spec, tour_name, n, cand):
+    """"Initializer of the neighborhood evaluation workers: attach the distance matrix and the tour block"""
+    global _d, _tour, _tabu, _cand
+    _d = attach_matrix(spec)
+    shm = shared_memory.SharedMemory(name=tour_name)
+    _shm.append(shm)
+    _tour = np.ndarray(n + 1, np.int32, buffer=shm.buf)
+    _tabu = np.ndarray(n, np.bool_, buffer=shm.buf, offset=4 * (n + 1))
+    _cand = cand
+
+
+def two_opt_rows_worker(x_lo, x_hi, fs, use_tabu, fs_star):
+    """"Best 2-opt move of the shared tour for rows x_lo <= x < x_hi"""
+    delta, x, y = ls.best_two_opt_rows(distance.as_array(_d), _tour, fs, x_lo, x_hi, _tabu if use_tabu else None,
+                                       fs_star)
+    return float(delta), int(x), int(y)
+
+
+def three_opt_edges_worker(p_lo, p_hi, fs, use_tabu, fs_star):
+    """"Best 3-opt move of the shared tour built from the edges at positions p_lo <= p < p_hi"""
+    s = _tour.tolist()
+    return ls.best_three_opt_candidate_move(_d, s, fs, _cand, p_lo, p_hi, _tabu.tolist() if use_tabu else None,
+                                            fs_star)
+
+
+def split_rows(m, parts):
+    """"Bounds of parts ranges of rows 0...m-1 of a triangular neighborhood (row x has m - x columns) with about
+    the same number of moves each"""
+    bounds = sorted({min(m, round(m - m * (1 - k / parts) ** 0.5)) for k in range(parts + 1)})
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class NeighborhoodPool:
+    """"Pool of worker processes evaluating ranges of a neighborhood in parallel
+    The distance matrix and a block holding the current tour (and its tabu edges) are shared with the workers; each
+    evaluation copies the tour to the block, every worker returns the best move of its range and the best of them is
+    kept. Worth it on large instances only (see bench.py crossover)"""
+
+    def __init__(self, d, workers, cand=None):
+        self.d = d
+        self.workers = workers
+        self.n = n = len(d)
+        self.shm, spec = share_matrix(d)
+        self.tour_shm = shared_memory.SharedMemory(create=True, size=4 * (n + 1) + n)
+        self.tour = np.ndarray(n + 1, np.int32, buffer=self.tour_shm.buf)
+        self.tabu = np.ndarray(n, np.bool_, buffer=self.tour_shm.buf, offset=4 * (n + 1))
+        self.pool = mp.Pool(workers, initializer=init_evaluator, initargs=(spec, self.tour_shm.name, n, cand))
+
+    def share(self, s, tabu):
+        """"Write tour s (and its tabu edges) to the shared block"""
+        self.tour[:] = s.t_view if isinstance(s, tsp.Tour) else s
+        if tabu is not None:
+            self.tabu[:] = tabu
+
+    def best_two_opt_move(self, s, fs, tabu=None, fs_star=float("-inf")):
+        """"Best 2-opt neighbor (fs, i, j) of s as ls.best_two_opt_move without candidate lists (None if no move)"""
+        self.share(s, tabu)
+        args = [(lo, hi, fs, tabu is not None, fs_star) for lo, hi in split_rows(self.n - 2, self.workers)]
+        delta, x, y = min(self.pool.starmap(two_opt_rows_worker, args))
+        if delta == np.inf:
+            return None
+        return fs + delta, x + 1, y
+
+    def best_three_opt_move(self, s, fs, tabu=None, fs_star=float("-inf")):
+        """"Best 3-opt neighbor (fs, i, j, k) of s as ls.best_three_opt_candidate_move (None if no move)"""
+        self.share(s, tabu)
+        bounds = [self.n * k // self.workers for k in range(self.workers + 1)]
+        args = [(lo, hi, fs, tabu is not None, fs_star) for lo, hi in zip(bounds[:-1], bounds[1:]) if lo < hi]
+        moves = [m for m in self.pool.starmap(three_opt_edges_worker, args) if m is not None]
+        return min(moves) if moves else None
+
+    def close(self):
+        """"Stop the workers and free the shared memory blocks"""
+        self.pool.terminate()
+        self.pool.join()
+        del self.tour, self.tabu
+        self.tour_shm.close()
+        self.tour_shm.unlink()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
@@ -11,6 +11,15 @@ class Params:
         self.lb = 0
         self.output = 0
         self.chart = 0
+        self.stats = None
+        self.trace_size = 10000
+        self.trace_mode = "ALL"
+        self.trace_file = None
+        self.dtype = "float64"
+        self.matrix_mb = 1024
+        self.oracle_cache_mb = 256
+        self.cache_dir = None
+        self.clear_cache = 0
 
         self.constructive = "PARTGREEDY"
         self.alpha = 0.0
@@ -18,13 +27,24 @@ class Params:
         self.algorithm = "ILS"
         self.localsearch = "RANDOM*"
         self.neigh_types = 2
+        self.vnd_order = None
         self.ls_max = 1000
+        self.candidates = 0
+        self.cand = None  # candidate lists (built by main)
+        self.eval_workers = 1
+        self.pool = None  # parallel.NeighborhoodPool (built by main)
+        self.tour_repr = "ARRAY"
 
         self.grasp_alpha = 0.10
+        self.workers = 1
+        self.islands = 1
+        self.migration = 5
         self.sa_alpha = 0.90
         self.sa_max = 100
         self.sa_t_0 = 100
-        self.tabu_max = 100
+        self.sa_t_init = "FIXED"
+        self.tabu_max = None
+        self.tabu_mode = "EDGE"
         self.vns_k_max = 2
         self.ils_p_level = 3
         self.fix_opt_n = 200
@@ -66,6 +86,45 @@ class Params:
                 self.chart = int(args[i+1])
                 print("Convergence chart will be written on file (0.no/1.yes) %d" % self.chart)
                 i += 2
+            elif args[i] == "-stats":
+                self.stats = args[i + 1]
+                print("Search statistics will be written to %s" % self.stats)
+                i += 2
+            elif args[i] == "-trace_size":
+                self.trace_size = int(args[i + 1])
+                print("Convergence trace size set to %d" % self.trace_size)
+                i += 2
+            elif args[i] == "-trace_mode":
+                self.trace_mode = args[i + 1]
+                if self.trace_mode not in ("ALL", "BEST"):
+                    print(f'ERROR: Unknown trace mode {self.trace_mode}!\n')
+                    return False
+                print("Convergence trace mode set to %s" % self.trace_mode)
+                i += 2
+            elif args[i] == "-trace_file":
+                self.trace_file = args[i + 1]
+                print("Convergence trace will be streamed to %s" % self.trace_file)
+                i += 2
+            elif args[i] == "-dtype":
+                self.dtype = args[i + 1]
+                print("Distance matrix dtype set to %s" % self.dtype)
+                i += 2
+            elif args[i] == "-matrix_mb":
+                self.matrix_mb = float(args[i + 1])
+                print("Distance matrix memory budget (MB) set to %f" % self.matrix_mb)
+                i += 2
+            elif args[i] == "-oracle_cache_mb":
+                self.oracle_cache_mb = float(args[i + 1])
+                print("Distance oracle row cache (MB) set to %f" % self.oracle_cache_mb)
+                i += 2
+            elif args[i] == "-cache_dir":
+                self.cache_dir = args[i + 1]
+                print("Instance cache directory set to %s" % self.cache_dir)
+                i += 2
+            elif args[i] == "-clear_cache":
+                self.clear_cache = int(args[i + 1])
+                print("Instance cache will be cleared before reading the instance (0.no/1.yes) %d" % self.clear_cache)
+                i += 2
             elif args[i] == "-constructive":
                 self.constructive = args[i + 1]
                 print("Constructive method set to %s" % self.constructive)
@@ -82,6 +141,14 @@ class Params:
                 self.localsearch = args[i + 1]
                 print("Local search method set to %s" % self.localsearch)
                 i += 2
+            elif args[i] == "-vnd_order":
+                self.vnd_order = args[i + 1].split(",")
+                for name in self.vnd_order:
+                    if name not in ("2opt", "3opt", "oropt", "swap", "lk"):
+                        print(f'ERROR: Unknown VND neighborhood {name}!\n')
+                        return False
+                print("VND neighborhood order set to %s" % ", ".join(self.vnd_order))
+                i += 2
             elif args[i] == "-ls_max":
                 self.ls_max = int(args[i + 1])
                 print("Max local search iters (* num cities) set to %d" % self.ls_max)
@@ -90,10 +157,37 @@ class Params:
                 self.neigh_types = int(args[i + 1])
                 print("Number of neighborhood types set to %d" % self.neigh_types)
                 i += 2
+            elif args[i] == "-candidates":
+                self.candidates = int(args[i + 1])
+                print("Candidate list size (nearest neighbors per city) set to %d" % self.candidates)
+                i += 2
+            elif args[i] == "-eval_workers":
+                self.eval_workers = int(args[i + 1])
+                print("Neighborhood evaluation processes set to %d" % self.eval_workers)
+                i += 2
+            elif args[i] == "-tour_repr":
+                self.tour_repr = args[i + 1]
+                if self.tour_repr not in ("ARRAY", "TWOLEVEL"):
+                    print(f'ERROR: Unknown tour representation {self.tour_repr}!\n')
+                    return False
+                print("Tour representation set to %s" % self.tour_repr)
+                i += 2
             elif args[i] == "-grasp_alpha":
                 self.grasp_alpha = float(args[i + 1])
                 print("GRASP alpha set to %f" % self.grasp_alpha)
                 i += 2
+            elif args[i] == "-workers":
+                self.workers = int(args[i + 1])
+                print("GRASP worker processes set to %d" % self.workers)
+                i += 2
+            elif args[i] == "-islands":
+                self.islands = int(args[i + 1])
+                print("Islands (ILS/SA processes) set to %d" % self.islands)
+                i += 2
+            elif args[i] == "-migration":
+                self.migration = float(args[i + 1])
+                print("Island migration interval set to %f" % self.migration)
+                i += 2
             elif args[i] == "-sa_alpha":
                 self.sa_alpha = float(args[i + 1])
                 print("SA alpha set to %f" % self.sa_alpha)
@@ -106,9 +200,23 @@ class Params:
                 self.sa_t_0 = int(args[i + 1])
                 print("SA initial temperature set to %d" % self.sa_t_0)
                 i += 2
+            elif args[i] == "-sa_t_init":
+                self.sa_t_init = args[i + 1]
+                if self.sa_t_init not in ("FIXED", "SAMPLING", "SIMULATION"):
+                    print(f'ERROR: Unknown SA initial temperature method {self.sa_t_init}!\n')
+                    return False
+                print("SA initial temperature method set to %s" % self.sa_t_init)
+                i += 2
             elif args[i] == "-tabu_max":
                 self.tabu_max = int(args[i + 1])
-                print("Tabu list size set to %d" % self.tabu_max)
+                print("Tabu tenure set to %d" % self.tabu_max)
+                i += 2
+            elif args[i] == "-tabu_mode":
+                self.tabu_mode = args[i + 1]
+                if self.tabu_mode not in ("EDGE", "SOLN"):
+                    print(f'ERROR: Unknown tabu mode {self.tabu_mode}!\n')
+                    return False
+                print("Tabu mode set to %s" % self.tabu_mode)
                 i += 2
             elif args[i] == "-vns_k_max":
                 self.vns_k_max = int(args[i + 1])
@@ -129,12 +237,29 @@ class Params:
             else:
                 print(f'\nWARNING: Unrecognized argument {args[i]}')
                 # return False
+        if self.tour_repr == "TWOLEVEL" and self.algorithm == "ILS" and self.localsearch not in ("DLB2", "LK", "RANDOM2"):
+            print(f'ERROR: Local search {self.localsearch} does not support the TWOLEVEL tour representation!\n')
+            return False
+        if self.eval_workers > 1 and (self.islands > 1 or self.workers > 1):
+            print('ERROR: -eval_workers cannot be combined with -islands or -workers!\n')
+            return False
+        if self.eval_workers > 1 and not ((self.algorithm == "TS" and self.tabu_mode == "EDGE") or
+                                          (self.algorithm in ("ILS", "VNS") and
+                                           (self.localsearch == "DESCENT2" or
+                                            (self.localsearch == "DESCENT3" and self.candidates > 0)))):
+            print('ERROR: -eval_workers only runs TS (EDGE mode) and the DESCENT2 and DESCENT3 (with -candidates) local '
+                  'searches of ILS and VNS!\n')
+            return False
+        if self.islands > 1 and self.algorithm not in ("ILS", "SA"):
+            print('ERROR: The island model (-islands) only runs ILS and SA!\n')
+            return False
         print()
         return True
 
     def print_usage(self):
         print(f"Usage: python main.py <instance> [params]")
         print(f"    <instance> : Path of the instance file in TSPLIB95 format.")
+        print(f"                 (EDGE_WEIGHT_TYPE: EUC_2D, CEIL_2D, ATT, GEO, MAN_2D, MAX_2D or EXPLICIT)")
         print(f"")
         print(f"Parameters:")
         print(f"  -timelimit <time>     : runtime limit (secs) (default: = num cities).")
@@ -143,25 +268,71 @@ class Params:
         print(f"  -lb <value>           : lower bound for this instance (default: {self.lb}).")
         print(f"  -output <0/1>         : plot the solution to /output folder (0/1) (default: {self.output}).")
         print(f"  -chart <0/1>          : write convergence chart to /output folder (0/1)  (default: {self.chart}).")
+        print(f"  -stats <file>         : count evaluations, improving and accepted moves per neighborhood and time each")
+        print(f"                          phase of the search; written to a JSON file and printed as a table at the end")
+        print(f"                          (main process only) (default: {self.stats}).")
+        print(f"  -trace_size <n>       : records of the convergence trace kept in memory (downsampled when full) (default: {self.trace_size}).")
+        print(f"  -trace_mode <value>   : records kept by the convergence trace; possible values are {{ALL, BEST}}")
+        print(f"                          (ALL = evenly sampled records and the improvements of the best solution,")
+        print(f"                          BEST = the improvements only) (default: {self.trace_mode}).")
+        print(f"  -trace_file <file>    : stream every record of the convergence trace to a .csv or .jsonl file (one file")
+        print(f"                          per process with -workers/-islands) (default: {self.trace_file}).")
+        print(f"  -dtype <value>        : floating point type of the distance matrix {{float64, float32}} (default: {self.dtype}).")
+        print(f"  -matrix_mb <value>    : memory budget (MB) of the full distance matrix; larger instances use a lazy")
+        print(f"                          distance oracle computed from coordinates (default: {self.matrix_mb}).")
+        print(f"  -oracle_cache_mb <v>  : memory (MB) of the row cache of the distance oracle (default: {self.oracle_cache_mb}).")
+        print(f"  -cache_dir <dir>      : directory of the binary instance cache (memory-mapped .npy files) (default: {self.cache_dir}).")
+        print(f"  -clear_cache <0/1>    : clear the instance cache directory before reading the instance (default: {self.clear_cache}).")
         print(f"  -constructive <value> : select the constructive method to build initial solutions; possible values are")
-        print(f"                          {{GREEDY, PARTGREEDY}} (default: {self.constructive})")
+        print(f"                          {{GREEDY, PARTGREEDY, INSERTION, NEARINSERTION, FARINSERTION, GREEDYEDGE, HILBERT, MST}}")
+        print(f"                          (cheapest, nearest and farthest insertion | greedy edge matching | Hilbert space-filling")
+        print(f"                          curve order, needs city coordinates | minimum spanning tree double-tree)")
+        print(f"                          (default: {self.constructive})")
         print(f"  -alpha <value>        : alpha value to the partially greedy constructive algorithm (default: {self.alpha}).")
         print(f"  -algorithm <value>    : select the optimization algorithm to execute; possible values are")
         print(f"                          {{GRASP, TS, SA, VNS, ILS, FIXOPT, MIP}} (default: {self.algorithm})")
         print(f"  -localsearch <value>  : local search method to use inside the main algorithm; possible values are")
-        print(f"                          {{RANDOM*, RANDOM2, RANDOM3, DESCENT2, DESCENT3, FIRSTIMPROV2, FIRSTIMPROV3, VND*}}")
-        print(f"                          (2 = 2-opt | 3 = 3-opt | * = both) (default: {self.localsearch})")
+        print(f"                          {{RANDOM*, RANDOM2, RANDOM3, DESCENT2, DESCENT3, FIRSTIMPROV2, FIRSTIMPROV3, DLB2, DLB3, LK, VND*}}")
+        print(f"                          (2 = 2-opt | 3 = 3-opt | * = both | DLB = first improvement with don't-look bits")
+        print(f"                          | LK = Lin-Kernighan style variable-depth search) (default: {self.localsearch})")
         print(f"  -neigh_types <n>      : number of neighborhood types to apply (1=2-opt / 2=2-opt and 3-opt) (default: {self.neigh_types}).")
+        print(f"  -vnd_order <list>     : comma separated order of VND neighborhoods among {{2opt, 3opt, oropt, swap, lk}}")
+        print(f"                          (default: first neigh_types of 2opt,3opt).")
         print(f"  -ls_max <n>           : maximum number of random local search iters (default: {self.ls_max}).")
+        print(f"  -candidates <k>       : size of the candidate lists (k nearest neighbors of each city) scanned by the DLB")
+        print(f"                          and LK searches, the 3-opt moves of TS and the greedy constructives (the restricted")
+        print(f"                          candidate list of PARTGREEDY and GRASP is drawn from them); k > 0 also restricts the 2-opt,")
+        print(f"                          3-opt, Or-opt and swap neighborhoods to them")
+        print(f"                          (0 = lists of 10 cities and full 2-opt, 3-opt, Or-opt and swap neighborhoods) (default: {self.candidates}).")
+        print(f"  -eval_workers <n>     : number of processes evaluating the 2-opt and 3-opt neighborhoods of DESCENT2,")
+        print(f"                          DESCENT3 (with -candidates, in ILS and VNS) and TS (EDGE mode) in parallel (pays")
+        print(f"                          off on large instances only, see bench.py)")
+        print(f"                          (default: {self.eval_workers}).")
+        print(f"  -tour_repr <value>    : tour representation used by SA and ILS; possible values are {{ARRAY, TWOLEVEL}}")
+        print(f"                          (TWOLEVEL = two-level doubly-linked list with O(sqrt(n)) reversals, for large")
+        print(f"                          instances; SA then uses 2-opt and Or-opt moves and ILS requires DLB2, LK or RANDOM2)")
+        print(f"                          (default: {self.tour_repr}).")
         print(f"  -grasp_alpha <value>  : alpha value to GRASP algorithm (default: {self.grasp_alpha}).")
+        print(f"  -workers <n>          : number of processes running GRASP iterations in parallel (shared distance")
+        print(f"                          matrix, independent random streams) (default: {self.workers}).")
+        print(f"  -islands <n>          : number of ILS or SA islands run in parallel processes with different seeds; they")
+        print(f"                          exchange their best tour through a shared incumbent board (default: {self.islands}).")
+        print(f"  -migration <secs>     : interval between two exchanges of an island with the board (default: {self.migration}).")
         print(f"  -sa_t_0 <value>       : initial temperature value to Simulated Annealing algorithm (default: {self.sa_t_0}).")
+        print(f"  -sa_t_init <value>    : how Simulated Annealing sets its initial temperature; possible values are")
+        print(f"                          {{FIXED, SAMPLING, SIMULATION}} (FIXED = sa_t_0, SAMPLING = largest cost variation of")
+        print(f"                          random neighbors, SIMULATION = raised from sa_t_0 until 90% of random neighbors are")
+        print(f"                          accepted) (default: {self.sa_t_init}).")
         print(f"  -sa_alpha <value>     : alpha value to Simulated Annealing algorithm (default: {self.sa_alpha}).")
         print(f"  -sa_max <value>       : SAmax value (* num cities) to Simulated Annealing algorithm (default: {self.sa_max}).")
-        print(f"  -tabu_max <value>     : size of tabu list of Tabu Search algorithm (default: {self.tabu_max}).")
+        print(f"  -tabu_max <value>     : tabu tenure (iterations) of Tabu Search algorithm (default: num cities / 5).")
+        print(f"  -tabu_mode <value>    : tabu memory of Tabu Search algorithm; possible values are {{EDGE, SOLN}}")
+        print(f"                          (EDGE = moves removing edges added in the last iterations are tabu,")
+        print(f"                          SOLN = the tours visited in the last iterations are tabu) (default: {self.tabu_mode}).")
         print(f"  -vns_max_k <value>    : maximum neighborhood size to VNS algorithm (default: {self.vns_k_max}).")
         print(f"  -ils_p_level <value>  : perturbation level to ILS algorithm (default: {self.ils_p_level}).")
         print(f"  -fixopt_it_tl <time>  : runtime limit (secs) for each iteration of fixopt (default: {self.fix_opt_it_tl}).")
-        print(f"  -fixopt_n <n>         : number of cities to be optimized at each iteration of fixopt (default: {self.fixopt_n}).")
+        print(f"  -fixopt_n <n>         : number of cities to be optimized at each iteration of fixopt (default: {self.fix_opt_n}).")
         print(f"")
         print(f"Example:")
         print(f"  python main.py /datasets/att48.tsp -timelimit 60 -seed 1 -algorithm GRASP -localsearch DESCENT2 -grasp_alpha 0.1")
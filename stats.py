@@ -0,0 +1,201 @@
+import json
+import time
+import numpy as np
+import tsp
+
+
+EPS = 0.0001  # a move is improving if it lowers the cost by more than EPS (as local_search.EPS)
+
+# kernels of tsp wrapped by enable(), by neighborhood
+EVALS = {"two_opt": "2opt", "three_opt": "3opt", "or_opt": "oropt", "swap": "swap", "two_opt_city": "2opt",
+         "or_opt_city": "oropt"}
+DELTAS = {"two_opt_deltas": "2opt", "three_opt_deltas": "3opt"}
+MOVES = {"two_opt_move": "2opt", "three_opt_move": "3opt", "or_opt_move": "oropt", "swap_move": "swap",
+         "two_opt_city_move": "2opt", "or_opt_city_move": "oropt"}
+
+ENABLED = False   # instrumentation on (set by enable)
+phases = {}       # phase path -> [calls, seconds]
+counts = {}       # phase path -> {neighborhood: [evaluations, improving moves, accepted moves]}
+_path = ""        # path of the current phase (names of the nested phases joined by "/", "" outside them)
+_current = counts.setdefault(_path, {})
+_kernels = {}     # original kernels of tsp replaced by enable()
+_t_enable = 0.0
+
+
+class Phase:
+    """"Context timing a phase of the search (nested in the current one); the evaluations and moves made inside it
+    are counted under its path"""
+    __slots__ = ("name", "outer", "t")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        global _path, _current
+        self.outer = _path
+        _path = f'{_path}/{self.name}' if _path else self.name
+        _current = counts.setdefault(_path, {})
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _path, _current
+        p = phases.get(_path)
+        if p is None:
+            p = phases[_path] = [0, 0.0]
+        p[0] += 1
+        p[1] += time.perf_counter() - self.t
+        _path = self.outer
+        _current = counts[_path]
+        return False
+
+
+class Off:
+    """"Context doing nothing: the phases of the search when the instrumentation is off"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+OFF = Off()
+
+
+def phase(name):
+    """"Context timing phase `name` of the search when the instrumentation is on (a shared no-op context otherwise)"""
+    return Phase(name) if ENABLED else OFF
+
+
+def counter(neighborhood):
+    """"Counters [evaluations, improving, accepted] of a neighborhood in the current phase"""
+    c = _current.get(neighborhood)
+    if c is None:
+        c = _current[neighborhood] = [0, 0, 0]
+    return c
+
+
+def count(neighborhood, evaluations=0, improving=0, accepted=0):
+    """"Add to the counters of a neighborhood in the current phase (for the evaluations not made by the kernels of
+    tsp; callers check ENABLED first)"""
+    c = counter(neighborhood)
+    c[0] += evaluations
+    c[1] += improving
+    c[2] += accepted
+
+
+def counting_eval(f, neighborhood):
+    """"Kernel f evaluating a move (returns the new cost, or (s, cost) for swap) counting it"""
+    def kernel(d, s, fs, *args):
+        r = f(d, s, fs, *args)
+        c = counter(neighborhood)
+        c[0] += 1
+        if (r[1] if type(r) is tuple else r) + EPS < fs:
+            c[1] += 1
+        return r
+    return kernel
+
+
+def counting_deltas(f, neighborhood):
+    """"Kernel f evaluating moves by NumPy (returns their cost variations) counting them"""
+    def kernel(*args):
+        r = f(*args)
+        c = counter(neighborhood)
+        c[0] += r.size
+        c[1] += int(np.count_nonzero(r < -EPS))
+        return r
+    return kernel
+
+
+def counting_move(f, neighborhood):
+    """"Kernel f applying a move counting it as accepted (the evaluation it makes itself is not counted)"""
+    def kernel(*args):
+        c = counter(neighborhood)
+        evaluations, improving = c[0], c[1]
+        r = f(*args)
+        c[0], c[1] = evaluations, improving
+        c[2] += 1
+        return r
+    return kernel
+
+
+def kernel(name):
+    """"Kernel `name` of tsp, the original one if the instrumentation replaced it (for callers counting by themselves)"""
+    return _kernels.get(name) or getattr(tsp, name)
+
+
+def enable():
+    """"Turn the instrumentation on: the move kernels of tsp are replaced by counting versions (callers reach them
+    as tsp.<kernel>, so nothing is paid while it is off) and the counters are reset"""
+    global ENABLED
+    if not ENABLED:
+        for table, wrap in ((EVALS, counting_eval), (DELTAS, counting_deltas), (MOVES, counting_move)):
+            for name, neighborhood in table.items():
+                _kernels[name] = getattr(tsp, name)
+                setattr(tsp, name, wrap(_kernels[name], neighborhood))
+        ENABLED = True
+    reset()
+
+
+def disable():
+    """"Turn the instrumentation off, restoring the original kernels of tsp"""
+    global ENABLED
+    for name, f in _kernels.items():
+        setattr(tsp, name, f)
+    _kernels.clear()
+    ENABLED = False
+
+
+def reset():
+    """"Clear the counters and timers"""
+    global _path, _current, _t_enable
+    phases.clear()
+    counts.clear()
+    _path = ""
+    _current = counts.setdefault(_path, {})
+    _t_enable = time.perf_counter()
+
+
+def summary():
+    """"Counters and timers as a dict: wall time since enable and, for each phase path, its calls, time and the
+    evaluations, improving and accepted moves of each neighborhood ("" holds those made outside any phase)"""
+    out = {}
+    for path in [p for p, c in counts.items() if p in phases or c]:  # in order of first entry
+        calls, t = phases.get(path, (0, 0.0))
+        out[path] = {"calls": calls, "time": t,
+                     "neighborhoods": {nb: {"evaluations": e, "improving": i, "accepted": a}
+                                       for nb, (e, i, a) in sorted(counts.get(path, {}).items())}}
+    return {"time": time.perf_counter() - _t_enable, "phases": out}
+
+
+def evaluations():
+    """"Moves evaluated since enable (all phases and neighborhoods)"""
+    return sum(c[0] for neighborhoods in counts.values() for c in neighborhoods.values())
+
+
+def dump(file):
+    """"Write summary() to a JSON file"""
+    with open(file, "w") as f:
+        json.dump(summary(), f, indent=2)
+
+
+def print_table():
+    """"Print summary() as a table: a row per phase (nested phases indented) followed by a row per neighborhood"""
+    data = summary()
+    total = data["time"]
+    print(f'{"phase / neighborhood":40} {"calls":>9} {"time (s)":>10} {"share":>7} {"evals":>12} {"improving":>10} '
+          f'{"accepted":>9} {"evals/s":>11}')
+    for path, p in data["phases"].items():
+        name = "  " * path.count("/") + (path.rsplit("/", 1)[-1] if path else "(outside phases)")
+        share = f'{100 * p["time"] / total:6.1f}%' if total > 0 and path else ""
+        if path:
+            print(f'{name:40} {p["calls"]:9d} {p["time"]:10.3f} {share:>7}')
+        else:
+            print(name)
+        for nb, c in p["neighborhoods"].items():
+            rate = f'{c["evaluations"] / p["time"]:11.0f}' if p["time"] > 0 else ""
+            print(f'{"  " * (path.count("/") + 1) + nb:40} {"":9} {"":10} {"":7} {c["evaluations"]:12d} '
+                  f'{c["improving"]:10d} {c["accepted"]:9d} {rate:>11}')
+    print(f'{"total":40} {"":9} {total:10.3f}')
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+MASK = (1 << 64) - 1
+
+
+class TabuMemory:
+    """"Attribute-based tabu memory of Tabu Search
+    The edges added by a move may not be removed again for `tenure` iterations: expire[edge] holds the iteration
+    until which an edge is tabu, so a tabu check costs O(1) (a dict rather than an n x n array, which would not
+    fit large instances). In solution mode the hashes of the last `tenure` visited tours are kept instead"""
+
+    def __init__(self, tenure):
+        self.tenure = tenure
+        self.it = 0
+        self.expire = {}     # edge key (min city, max city) -> last iteration in which the edge is tabu
+        self.solutions = {}  # tour hash -> last iteration in which the tour is tabu
+
+    def next_iteration(self):
+        """"Advance the iteration counter (expired entries are purged every `tenure` iterations)"""
+        self.it += 1
+        if self.it % max(1, self.tenure) == 0:
+            self.expire = {e: t for e, t in self.expire.items() if t >= self.it}
+            self.solutions = {h: t for h, t in self.solutions.items() if t >= self.it}
+
+    def is_tabu(self, a, b):
+        """"True if removing edge (a, b) is tabu"""
+        return self.expire.get((a, b) if a < b else (b, a), -1) >= self.it
+
+    def add_edges(self, edges):
+        """"Make the given edges (keys (min city, max city)) tabu for the next `tenure` iterations"""
+        until = self.it + self.tenure
+        for e in edges:
+            self.expire[e] = until
+
+    def edge_mask(self, s):
+        """"Boolean array of the tabu edges of tour s: mask[x] is True if edge (s[x], s[x+1]) is tabu
+        O(number of tabu edges) instead of a lookup per edge of the tour"""
+        n = len(s) - 1
+        mask = np.zeros(n, dtype=bool)
+        pos = s.pos
+        for (a, b), t in self.expire.items():
+            if t >= self.it:
+                p = pos[a]
+                if s[p + 1] == b:
+                    mask[p] = True
+                elif s[p - 1 if p else n - 1] == b:
+                    mask[p - 1 if p else n - 1] = True
+        return mask
+
+    def is_tabu_solution(self, h):
+        """"True if the tour of hash h was visited in the last `tenure` iterations"""
+        return self.solutions.get(h, -1) >= self.it
+
+    def add_solution(self, h):
+        """"Make the tour of hash h tabu for the next `tenure` iterations"""
+        self.solutions[h] = self.it + self.tenure
+
+
+def incident_edges(s, cities):
+    """"Keys of the tour edges incident to the given cities (s is a Tour)"""
+    edges = set()
+    for c in cities:
+        for b in (s.next(c), s.prev(c)):
+            edges.add((c, b) if c < b else (b, c))
+    return edges
+
+
+def edge_hash(a, b):
+    """"64-bit hash of the undirected edge (a, b) (SplitMix64 finalizer of the pair)"""
+    if a > b:
+        a, b = b, a
+    z = ((a << 32) | b) * 0x9E3779B97F4A7C15 & MASK
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK
+    return z ^ (z >> 31)
+
+
+def tour_hash(s):
+    """"Hash of the edge set of a closed tour s (XOR of its edge hashes): it does not depend on the starting city
+    nor on the direction, and a move updates it in O(1) by XORing the hashes of the removed and added edges"""
+    t = np.asarray(s, dtype=np.uint64)
+    a = np.minimum(t[:-1], t[1:])
+    b = np.maximum(t[:-1], t[1:])
+    with np.errstate(over="ignore"):
+        z = ((a << np.uint64(32)) | b) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return int(np.bitwise_xor.reduce(z))
@@ -1,25 +1,32 @@
+import math
 import random
 import time
+from array import array
+import numpy as np
+import distance
 
 
-def greedy_build(d):
-    """"Greedy initial solution build by nearest neighbor heuristic"""
+def greedy_build(d, cand=None):
+    """"Greedy initial solution build by nearest neighbor heuristic
+    The next city is the first unvisited one of the candidate list of the last city (its neighbors sorted by distance,
+    visited cities tracked by a removal bitmap); the remaining cities are scanned (by NumPy) only when the whole list
+    is visited or without candidate lists"""
     t_init = time.time()
+    n = len(d)
+    seen = bytearray(n)
+    visited = np.frombuffer(seen, dtype=np.bool_)  # view of seen
+    seen[0] = 1
     s = [0]
     fs = 0
-    C = [i for i in range(1, len(d))]
-    while len(C) != 0:
-        # select c_min
-        min_dist = float("inf")
-        c_min = -1
-        for c in C:
-            if d[s[-1]][c] < min_dist:
-                min_dist = d[s[-1]][c]
-                c_min = c
-        # insert c_min in solution s
-        s.append(c_min)
-        fs += min_dist
-        C.remove(c_min)
+    for _ in range(n - 1):
+        row = d[s[-1]]
+        c = next((c for c in cand[s[-1]] if not seen[c]), -1) if cand is not None else -1
+        if c < 0:
+            C = np.flatnonzero(~visited)
+            c = int(C[np.argmin(np.asarray(row, dtype=np.float64)[C])])
+        fs += row[c]
+        s.append(c)
+        seen[c] = 1
     # add first node to close the cycle
     fs += d[s[-1]][s[0]]
     s.append(s[0])
@@ -28,61 +35,267 @@ def greedy_build(d):
 
 def greedy_build_cheapest_insertion(d):
     """"Greedy initial solution build by cheapest insertion heuristic"""
+    return insertion_build(d, "CHEAPEST")
+
+
+def insertion_build(d, rule="CHEAPEST", keep=4):
+    """"Initial solution build by insertion heuristics, starting from city 0 and its nearest (farthest) city
+    CHEAPEST inserts the city of cheapest insertion, NEAREST (FARTHEST) the city nearest to (farthest from) the tour,
+    each at its cheapest insertion edge. The keep cheapest edges of every city out of the tour are cached with a lower
+    bound on the costs of the other edges: an insertion drops the removed edge and offers the two new ones, and only
+    the cities whose best cached edge exceeds their bound rescan the tour (all by NumPy, O(n^2) instead of O(n^3))"""
     t_init = time.time()
-    s = [0, 2, 5, 0]  # 0, 2 and 5 can be random
-    fs = d[s[0]][s[1]] + d[s[1]][s[2]] + d[s[2]][s[3]]
-    C = [x for x in range(0, len(d)) if x not in s]
-    while C:
-        # select c_min
-        min_dist = float("inf")
-        c_min = -1
-        idx_min = -1
-        for idx in range(len(s) - 1):
-            i = s[idx]
-            j = s[idx + 1]
-            for k in C:
-                if d[i][k] + d[k][j] - d[i][j] < min_dist:
-                    min_dist = d[i][k] + d[k][j] - d[i][j]
-                    c_min = k
-                    idx_min = idx
-        # insert c_min in s after position idx_min
-        s.insert(idx_min + 1, c_min)
-        fs += min_dist
-        C.remove(c_min)
-    return s, fs, time.time() - t_init
+    n = len(d)
+    if n < 3:
+        s = list(range(n)) + [0]
+        return s, full_eval(d, s), time.time() - t_init
+
+    def row(c):  # distances from city c to every city
+        return np.asarray(d[c], dtype=np.float64)
+
+    ban = np.zeros(n)  # 0 for the cities out of the tour, inf for the cities of the tour
+    nxt = np.zeros(n, dtype=np.intp)
+    nodes = np.zeros(n, dtype=np.intp)  # cities of the tour (in insertion order)
+    near = np.array(d[0], dtype=np.float64)  # distance of each city to the tour (a copy, updated in place)
+    first = int(np.argmax(near)) if rule == "FARTHEST" else int(np.argmin(np.where(np.arange(n) == 0, np.inf, near)))
+    nxt[0], nxt[first] = first, 0
+    nodes[:2] = 0, first
+    ban[[0, first]] = np.inf
+    m = 2
+    np.minimum(near, row(first), out=near)
+    # cached insertion edges (tail[e, x], head[e, x]) of city x with cost increase cost[e, x] (inf: free slot)
+    keep = max(2, keep)
+    cost = np.full((keep, n), np.inf)
+    tail = np.zeros((keep, n), dtype=np.intp)
+    head = np.zeros((keep, n), dtype=np.intp)
+    cost[0] = cost[1] = row(0) + row(first) - d[0][first] + ban
+    tail[0] = head[1] = 0
+    tail[1] = head[0] = first
+    bound = np.full(n, np.inf)  # lower bound on the cost of the edges not cached
+    fs = 2 * d[0][first]
+    for _ in range(n - 2):
+        best = cost.min(axis=0)
+        stale = np.flatnonzero(best > bound)
+        if len(stale):  # rescan the whole tour
+            tails = nodes[:m]
+            heads = nxt[tails]
+            w = np.array([d[t][h] for t, h in zip(tails.tolist(), heads.tolist())])
+            for x in stale.tolist():
+                rx = row(x)
+                c = rx[tails] + rx[heads] - w
+                if m > keep:
+                    part = np.argpartition(c, keep)
+                    bound[x] = c[part[keep]]
+                    part = part[:keep]
+                else:
+                    part = np.arange(m)
+                    bound[x] = np.inf
+                cost[:, x] = np.inf
+                cost[:len(part), x] = c[part]
+                tail[:len(part), x] = tails[part]
+                head[:len(part), x] = heads[part]
+                best[x] = cost[:, x].min()
+        if rule == "CHEAPEST":
+            k = int(np.argmin(best))
+        elif rule == "NEAREST":
+            k = int(np.argmin(near + ban))
+        else:
+            k = int(np.argmax(near - ban))
+        # insert k between i and j
+        e = int(np.argmin(cost[:, k]))
+        i, j = int(tail[e, k]), int(head[e, k])
+        fs += cost[e, k]
+        nxt[i], nxt[k] = k, j
+        nodes[m] = k
+        m += 1
+        ban[k] = cost[:, k] = bound[k] = np.inf
+        rk = row(k)
+        np.minimum(near, rk, out=near)
+        # edge (i, j) is removed, edges (i, k) and (k, j) are offered to every city (replacing its worst cached edge)
+        cost[(tail == i) & (head == j)] = np.inf
+        for t, h, c in ((i, k, row(i) + rk - d[i][k]), (k, j, rk + row(j) - d[k][j])):
+            c += ban
+            worst = cost.max(axis=0)
+            np.minimum(bound, np.maximum(c, worst), out=bound)  # the edge or the evicted one is not cached
+            x = np.flatnonzero(c < worst)
+            e = np.argmax(cost[:, x], axis=0)
+            cost[e, x] = c[x]
+            tail[e, x] = t
+            head[e, x] = h
+    s = [0]
+    for _ in range(n - 1):
+        s.append(int(nxt[s[-1]]))
+    s.append(0)
+    return s, float(fs), time.time() - t_init
 
 
-def part_greedy_build(d, alpha):
-    """"Partially greedy initial solution build by nearest neighbor heuristic"""
+def part_greedy_build(d, alpha, cand=None):
+    """"Partially greedy initial solution build by nearest neighbor heuristic
+    The restricted candidate list (RCL) holds the cities within alpha of the nearest one, among the unvisited cities of
+    the candidate list of the last city (a bounded prefix of its neighbors sorted by distance, visited cities tracked by
+    a removal bitmap); the remaining cities are scanned (by NumPy) only when the whole list is visited or without
+    candidate lists"""
     t_init = time.time()
+    n = len(d)
+    seen = bytearray(n)
+    visited = np.frombuffer(seen, dtype=np.bool_)  # view of seen
+    seen[0] = 1
     s = [0]
     fs = 0
-    C = [i for i in range(1, len(d))]
-    while len(C) != 0:
-        # calculates best (g_min) and worst (g_max) candidates
-        g_max = float("-inf")
-        g_min = float("inf")
-        for c in C:
-            if d[s[-1]][c] > g_max:
-                g_max = d[s[-1]][c]
-            if d[s[-1]][c] < g_min:
-                g_min = d[s[-1]][c]
-        # create LCR
-        LCR = []
-        for c in C:
-            if d[s[-1]][c] <= g_min + alpha * (g_max - g_min):
-                LCR.append(c)
+    for _ in range(n - 1):
+        row = d[s[-1]]
+        near = [c for c in cand[s[-1]] if not seen[c]] if cand is not None else None
+        if near:
+            # candidates are sorted by distance: best (g_min) and worst (g_max) are the first and the last ones
+            g = [row[c] for c in near]
+            limit = g[0] + alpha * (g[-1] - g[0])
+            LCR = [c for c, g_c in zip(near, g) if g_c <= limit]
+        else:
+            C = np.flatnonzero(~visited)
+            g = np.asarray(row, dtype=np.float64)[C]
+            g_min = g.min()
+            LCR = C[g <= g_min + alpha * (g.max() - g_min)].tolist()
         # randomly select c and inserts in solution s
         c = random.choice(LCR)
-        fs += d[s[-1]][c]
+        fs += row[c]
         s.append(c)
-        C.remove(c)
+        seen[c] = 1
     # add first node to close the cycle
     fs += d[s[-1]][s[0]]
     s.append(s[0])
     return s, fs, time.time() - t_init
 
 
+def rotate_closed(order):
+    """"Closed tour (list) starting at city 0 from an order of all the cities"""
+    order = list(order)
+    k = order.index(0)
+    return order[k:] + order[:k] + [0]
+
+
+def greedy_edge_build(d, cand):
+    """"Initial solution build by greedy edge matching
+    The candidate edges (from the candidate lists) are taken by increasing length when both cities have degree < 2
+    and they do not close a cycle (union-find); the resulting paths are then joined end to end, each one to the
+    nearest free end of another path"""
+    t_init = time.time()
+    n = len(d)
+    a = d if isinstance(d, distance.Oracle) else distance.as_array(d)
+    i = np.repeat(np.arange(n), [len(c) for c in cand])
+    j = np.array([c for row in cand for c in row], dtype=np.intp)
+    key = np.unique(np.minimum(i, j) * n + np.maximum(i, j))
+    i, j = key // n, key % n
+    order = np.argsort(np.asarray(a[i, j]), kind="stable")
+    parent = list(range(n))
+    degree = [0] * n
+    adj = [[] for _ in range(n)]
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]  # path halving
+            x = parent[x]
+        return x
+
+    for x, y in zip(i[order].tolist(), j[order].tolist()):
+        if degree[x] < 2 and degree[y] < 2:
+            rx, ry = find(x), find(y)
+            if rx != ry:
+                parent[rx] = ry
+                degree[x] += 1
+                degree[y] += 1
+                adj[x].append(y)
+                adj[y].append(x)
+    # paths (a single city is a path too), walked from one of their ends
+    paths = []
+    done = bytearray(n)
+    for x in range(n):
+        if degree[x] < 2 and not done[x]:
+            path = [x]
+            done[x] = 1
+            prev = -1
+            while True:
+                nxt = [y for y in adj[path[-1]] if y != prev]
+                if not nxt:
+                    break
+                prev = path[-1]
+                path.append(nxt[0])
+                done[nxt[0]] = 1
+            paths.append(path)
+    # join the paths: from the end of the tour to the nearest free end of another path
+    ends = np.array([p[e] for p in paths for e in (0, -1)], dtype=np.intp)
+    free = np.ones(len(ends), dtype=bool)
+    free[:2] = False
+    tour = list(paths[0])
+    for _ in range(len(paths) - 1):
+        r = np.asarray(a[np.full(len(ends), tour[-1]), ends], dtype=np.float64)
+        e = int(np.argmin(np.where(free, r, np.inf)))
+        free[e - e % 2:e - e % 2 + 2] = False
+        tour.extend(paths[e // 2] if e % 2 == 0 else reversed(paths[e // 2]))
+    s = rotate_closed(tour)
+    return s, full_eval(d, s), time.time() - t_init
+
+
+def hilbert_keys(xy, order=16):
+    """"Position of each point along a Hilbert curve filling the bounding box on a 2^order x 2^order grid"""
+    side = 1 << order
+    lo = xy.min(axis=0)
+    span = max(float((xy.max(axis=0) - lo).max()), 1e-9)
+    x, y = (np.minimum((xy - lo) / span * side, side - 1).astype(np.int64)).T
+    key = np.zeros(len(xy), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        key += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so the curve of the next level starts and ends at the right corners
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return key
+
+
+def space_filling_curve_build(d, coord):
+    """"Initial solution build by visiting the cities along a Hilbert space-filling curve (O(n log n) sort)
+    It needs the coordinates of every city (EXPLICIT instances may have none)"""
+    if len(coord) != len(d):
+        raise ValueError("The Hilbert curve constructive needs the coordinates of every city")
+    t_init = time.time()
+    s = rotate_closed(np.argsort(hilbert_keys(distance.coord_array(coord)), kind="stable").tolist())
+    return s, full_eval(d, s), time.time() - t_init
+
+
+def mst_build(d):
+    """"Initial solution build by the double-tree heuristic: preorder walk of a minimum spanning tree (dense Prim,
+    by NumPy) shortcutting the repeated cities (at most twice the optimum for metric instances)"""
+    t_init = time.time()
+    n = len(d)
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    key = np.array(d[0], dtype=np.float64)  # distance of each city to the tree
+    key[0] = np.inf
+    parent = np.zeros(n, dtype=np.intp)
+    children = [[] for _ in range(n)]
+    for _ in range(n - 1):
+        v = int(np.argmin(key))
+        children[int(parent[v])].append(v)
+        in_tree[v] = True
+        key[v] = np.inf
+        r = np.asarray(d[v], dtype=np.float64)
+        closer = (r < key) & ~in_tree
+        key[closer] = r[closer]
+        parent[closer] = v
+    s = []
+    stack = [0]
+    while stack:
+        v = stack.pop()
+        s.append(v)
+        stack.extend(reversed(children[v]))
+    s.append(0)
+    return s, full_eval(d, s), time.time() - t_init
+
+
 def swap(d, s, fs, i, j):
     """"Eval swap of nodes at indexes i and j"""
     if i > j:
@@ -96,7 +309,7 @@ def swap(d, s, fs, i, j):
 
 
 def swap_move(d, s, fs, i, j):
-    """"Do swap nodes at indexes i and j"""
+    """"Do swap nodes at indexes i and j (in place)"""
     if i > j:
         i, j = j, i
     if j == i + 1:
@@ -105,6 +318,8 @@ def swap_move(d, s, fs, i, j):
         fs += - d[s[i - 1]][s[i]] - d[s[i]][s[i + 1]] - d[s[j - 1]][s[j]] - d[s[j]][s[j + 1]] \
               + d[s[i - 1]][s[j]] + d[s[j]][s[i + 1]] + d[s[j - 1]][s[i]] + d[s[i]][s[j + 1]]
     s[i], s[j] = s[j], s[i]
+    update_positions(s, i, i)
+    update_positions(s, j, j)
     return s, fs
 
 
@@ -116,16 +331,76 @@ def swap_move_naive(d, s, fs, i, j):
     return s, full_eval(d, s)
 
 
+def or_opt(d, s, fs, i, l, j, rev=False):
+    """"Eval Or-opt moving route segment [i...i+l-1] between nodes at indexes j and j+1 (reversed if rev)"""
+    a, b = s[i], s[i + l - 1]
+    if rev:
+        a, b = b, a
+    fs += d[s[i - 1]][s[i + l]] + d[s[j]][a] + d[b][s[j + 1]] \
+          - d[s[i - 1]][s[i]] - d[s[i + l - 1]][s[i + l]] - d[s[j]][s[j + 1]]
+    return fs
+
+
+def or_opt_move(d, s, fs, i, l, j, rev=False):
+    """"Do Or-opt move of route segment [i...i+l-1] between nodes at indexes j and j+1 (reversed if rev) in place"""
+    fs = or_opt(d, s, fs, i, l, j, rev)
+    seg = s[i:i + l]
+    if rev:
+        seg = seg[::-1]
+    if j < i:
+        s[j + 1:i + l] = seg + s[j + 1:i]
+        update_positions(s, j + 1, i + l - 1)
+    else:
+        s[i:j + 1] = s[i + l:j + 1] + seg
+        update_positions(s, i, j)
+    return s, fs
+
+
+def or_opt_move_naive(d, s, fs, i, l, j, rev=False):
+    """"Naive (slow) Or-opt move of route segment [i...i+l-1] between nodes at indexes j and j+1"""
+    seg = s[i:i + l]
+    if rev:
+        seg = seg[::-1]
+    if j < i:
+        s = s[0:j + 1] + seg + s[j + 1:i] + s[i + l:]
+    else:
+        s = s[0:i] + s[i + l:j + 1] + seg + s[j + 1:]
+    return s, full_eval(d, s)
+
+
 def two_opt(d, s, fs, i, j):
     """"Eval 2-opt at indexes i and j (reversion of route segment [i...j])"""
     fs += d[s[i - 1]][s[j]] + d[s[i]][s[j + 1]] - d[s[i - 1]][s[i]] - d[s[j]][s[j + 1]]
     return fs
 
 
+def two_opt_deltas(a, t, x, y):
+    """"Eval (vectorized) 2-opt moves removing edges (t[x], t[x+1]) and (t[y], t[y+1]), i.e., 2-opt at indexes
+    i = x + 1 and j = y, for NumPy arrays of edge indexes x < y (or grids broadcasting them); a is the distance array"""
+    tx, tx1, ty, ty1 = t[x], t[x + 1], t[y], t[y + 1]
+    return a[tx, ty] + a[tx1, ty1] - a[tx, tx1] - a[ty, ty1]
+
+
+def three_opt_deltas(a, t, i, j, k):
+    """"Eval (vectorized) 3-opt at indexes i, j and k (NumPy arrays, i < j < k) as three_opt does: cost variation of
+    the best combination of reversed route segments; a is the distance array (or an oracle, indexed a[x, y])"""
+    ti, ti1, tj, tj1, tk, tk1 = t[i], t[i + 1], t[j], t[j + 1], t[k], t[k + 1]
+    wi, wj, wk = a[ti, ti1], a[tj, tj1], a[tk, tk1]
+    removed = wi + wj + wk
+    c2 = np.where(i != j - 1, a[ti, tj] + a[ti1, tj1] - wi - wj, np.inf)
+    c3 = np.where(j != k - 1, a[tj, tk] + a[tj1, tk1] - wj - wk, np.inf)
+    c4 = np.where((i != j - 1) & (j != k - 1), a[ti, tj] + a[ti1, tk] + a[tj1, tk1] - removed, np.inf)
+    c5 = a[ti, tj1] + a[tk, ti1] + a[tj, tk1] - removed
+    c6 = a[ti, tj1] + a[tk, tj] + a[ti1, tk1] - removed
+    c7 = a[ti, tk] + a[tj1, ti1] + a[tj, tk1] - removed
+    c8 = a[ti, tk] + a[tj1, tj] + a[ti1, tk1] - removed
+    return np.minimum.reduce([c2, c3, c4, c5, c6, c7, c8])
+
+
 def two_opt_move(d, s, fs, i, j):
-    """"Do 2-opt move at indexes i and j (reverse route segment [i...j])"""
+    """"Do 2-opt move at indexes i and j (reverse route segment [i...j]) in place"""
     fs += d[s[i - 1]][s[j]] + d[s[i]][s[j + 1]] - d[s[i - 1]][s[i]] - d[s[j]][s[j + 1]]
-    s = s[0:i] + list(reversed(s[i:j+1])) + s[j+1:]
+    reverse(s, i, j)
     return s, fs
 
 
@@ -152,6 +427,30 @@ def three_opt(d, s, fs, i, j, k):
     return c_best_fs
 
 
+def three_opt_edges(d, s, fs, i, j, k):
+    """"Edges removed and added (as pairs of cities) by the 3-opt move at indexes i, j and k, for the combination of
+    reversed route segments three_opt_move picks (the same ties broken the same way), without applying it"""
+    ti, ti1, tj, tj1, tk, tk1 = s[i], s[i + 1], s[j], s[j + 1], s[k], s[k + 1]
+    wi, wj, wk = d[ti][ti1], d[tj][tj1], d[tk][tk1]
+    removed = [(ti, ti1), (tj, tj1), (tk, tk1)]
+    moves = []  # (cost, removed edges, added edges) in the order three_opt_move tries them
+    if i != j - 1:
+        moves.append((fs + d[ti][tj] + d[ti1][tj1] - wi - wj, removed[:2], [(ti, tj), (ti1, tj1)]))
+    if j != k - 1:
+        moves.append((fs + d[tj][tk] + d[tj1][tk1] - wj - wk, removed[1:], [(tj, tk), (tj1, tk1)]))
+    if i != j - 1 and j != k - 1:
+        moves.append((fs + d[ti][tj] + d[ti1][tk] + d[tj1][tk1] - wi - wj - wk, removed,
+                      [(ti, tj), (ti1, tk), (tj1, tk1)]))
+    moves.append((fs + d[ti][tj1] + d[tk][ti1] + d[tj][tk1] - wi - wj - wk, removed, [(ti, tj1), (tk, ti1), (tj, tk1)]))
+    moves.append((fs + d[ti][tj1] + d[tk][tj] + d[ti1][tk1] - wi - wj - wk, removed, [(ti, tj1), (tk, tj), (ti1, tk1)]))
+    moves.append((fs + d[ti][tk] + d[tj1][ti1] + d[tj][tk1] - wi - wj - wk, removed, [(ti, tk), (tj1, ti1), (tj, tk1)]))
+    moves.append((fs + d[ti][tk] + d[tj1][tj] + d[ti1][tk1] - wi - wj - wk, removed, [(ti, tk), (tj1, tj), (ti1, tk1)]))
+    c_fs = min(m[0] for m in moves)
+    for c, r, a in moves:
+        if c == c_fs:
+            return r, a
+
+
 def three_opt_move(d, s, fs, i, j, k):
     """"Do 3-opt move at indexes i, j and k (best combination of reversed route segments [i...j] and/or [j...k])"""
     # evaluate candidates
@@ -166,22 +465,38 @@ def three_opt_move(d, s, fs, i, j, k):
     c6_fs = fs + d[s[i]][s[j + 1]] + d[s[k]][s[j]] + d[s[i + 1]][s[k + 1]] - d[s[i]][s[i + 1]] - d[s[j]][s[j + 1]] - d[s[k]][s[k + 1]]
     c7_fs = fs + d[s[i]][s[k]] + d[s[j + 1]][s[i + 1]] + d[s[j]][s[k + 1]] - d[s[i]][s[i + 1]] - d[s[j]][s[j + 1]] - d[s[k]][s[k + 1]]
     c8_fs = fs + d[s[i]][s[k]] + d[s[j + 1]][s[j]] + d[s[i + 1]][s[k + 1]] - d[s[i]][s[i + 1]] - d[s[j]][s[j + 1]] - d[s[k]][s[k + 1]]
-    # move to the best candidate
+    # move to the best candidate (in place)
     c_fs = min(c2_fs, c3_fs, c4_fs, c5_fs, c6_fs, c7_fs, c8_fs)
     if c2_fs == c_fs:
-        s = s[0:i+1] + list(reversed(s[i+1:j+1])) + s[j+1:]
+        reverse(s, i + 1, j)
+        return s, c_fs
     elif c3_fs == c_fs:
-        s = s[0:j+1] + list(reversed(s[j+1:k+1])) + s[k+1:]
-    elif c4_fs == c_fs:
-        s = s[0:i+1] + list(reversed(s[i+1:j+1])) + list(reversed(s[j+1:k+1])) + s[k+1:]
-    elif c5_fs == c_fs:
-        s = s[0:i+1] + s[j+1:k+1] + s[i+1:j+1] + s[k+1:]
-    elif c6_fs == c_fs:
-        s = s[0:i+1] + s[j+1:k+1] + list(reversed(s[i+1:j+1])) + s[k+1:]
-    elif c7_fs == c_fs:
-        s = s[0:i+1] + list(reversed(s[j+1:k+1])) + s[i+1:j+1] + s[k+1:]
-    elif c8_fs == c_fs:
-        s = s[0:i+1] + list(reversed(s[j+1:k+1])) + list(reversed(s[i+1:j+1])) + s[k+1:]
+        reverse(s, j + 1, k)
+        return s, c_fs
+    # the other cases are sequences of reversals of the segments A = [i+1...j] and B = [j+1...k] (a i+1...j j+1...k g)
+    case = 4 if c4_fs == c_fs else 5 if c5_fs == c_fs else 6 if c6_fs == c_fs else 7 if c7_fs == c_fs else 8
+    if isinstance(s, Tour):
+        # a flip may reverse the rest of the cycle (and so the orientation), hence reversals by cities
+        a, b, c, e, f, g = s[i], s[i + 1], s[j], s[j + 1], s[k], s[k + 1]
+        if case == 4:
+            reconnect(s, a, b, c, e)      # a c...b e...f g
+            reconnect(s, b, e, f, g)      # a c...b f...e g
+        else:
+            reconnect(s, a, b, f, g)      # a f...e c...b g (case 8)
+            if case in (5, 6):
+                reconnect(s, a, f, e, c)  # a e...f c...b g (case 6)
+            if case in (5, 7):
+                reconnect(s, f if case == 5 else e, c, b, g)  # a e...f b...c g (case 5), a f...e b...c g (case 7)
+    elif case == 4:
+        reverse(s, i + 1, j)
+        reverse(s, j + 1, k)
+    else:
+        reverse(s, i + 1, k)  # reversed B then reversed A
+        m = i + k - j         # end of reversed B
+        if case in (5, 6):
+            reverse(s, i + 1, m)
+        if case in (5, 7):
+            reverse(s, m + 1, k)
     return s, c_fs
 
 
@@ -210,19 +525,19 @@ def three_opt_move_naive(d, s, fs, i, j, k):
     c8_fs = full_eval(d, c8)
     c_fs = min(c2_fs, c3_fs, c4_fs, c5_fs, c6_fs, c7_fs, c8_fs)
     if c2_fs == c_fs:
-        s = c2_fs
+        s = c2
     elif c3_fs == c_fs:
-        s = c3_fs
+        s = c3
     elif c4_fs == c_fs:
-        s = c4_fs
+        s = c4
     elif c5_fs == c_fs:
-        s = c5_fs
+        s = c5
     elif c6_fs == c_fs:
-        s = c6_fs
+        s = c6
     elif c7_fs == c_fs:
-        s = c7_fs
+        s = c7
     elif c8_fs == c_fs:
-        s = c8_fs
+        s = c8
     return s, c_fs
 
 
@@ -235,6 +550,427 @@ def move_to_neighbor(N, d, fs, s):
     return s, fs
 
 
+def two_opt_city(d, t, fs, a, c):
+    """"Eval 2-opt replacing edges (a, next(a)) and (c, next(c)) by (a, c) and (next(a), next(c))"""
+    b, e = t.next(a), t.next(c)
+    return fs + d[a][c] + d[b][e] - d[a][b] - d[c][e]
+
+
+def two_opt_city_move(d, t, fs, a, c):
+    """"Do 2-opt move replacing edges (a, next(a)) and (c, next(c)) by (a, c) and (next(a), next(c)) in place
+    (works on any tour offering next/prev/reverse_path: Tour or TwoLevelList)"""
+    b, e = t.next(a), t.next(c)
+    fs += d[a][c] + d[b][e] - d[a][b] - d[c][e]
+    t.reverse_path(b, c)
+    return t, fs
+
+
+def or_opt_city(d, t, fs, a, b, c, rev=False):
+    """"Eval Or-opt moving the path a...b between cities c and next(c) (reversed if rev)"""
+    p, q, e = t.prev(a), t.next(b), t.next(c)
+    fs += d[p][q] - d[p][a] - d[b][q] - d[c][e]
+    if rev:
+        return fs + d[c][b] + d[a][e]
+    return fs + d[c][a] + d[b][e]
+
+
+def or_opt_city_move(d, t, fs, a, b, c, rev=False):
+    """"Do Or-opt move of the path a...b between cities c and next(c) (reversed if rev) in place
+    The move is made of two (or three) reversals, each one written as a reconnection of edges"""
+    fs = or_opt_city(d, t, fs, a, b, c, rev)
+    p, q, e = t.prev(a), t.next(b), t.next(c)
+    reconnect(t, p, a, c, e)     # p c...q b...a e
+    reconnect(t, p, c, q, b)     # p q...c b...a e
+    if not rev:
+        reconnect(t, c, b, a, e)  # p q...c a...b e
+    return t, fs
+
+
+def reconnect(t, a, b, c, e):
+    """"Replace edges (a, b) and (c, e) by (a, c) and (b, e), where the path b...c joins both edges
+    The orientation of the tour may have been flipped by a previous reversal, so it is checked first"""
+    if t.next(a) == b:
+        t.reverse_path(b, c)
+    else:
+        t.reverse_path(c, b)
+
+
+def move_to_city_neighbor(N, d, fs, t):
+    """"Do either a 2-opt or an Or-opt move depending on the given city neighbor N"""
+    if len(N[0]) == 3:  # 2-opt neighbor (fs, a, c)
+        t, fs = two_opt_city_move(d, t, fs, N[0][1], N[0][2])
+    elif len(N[0]) == 5:  # Or-opt neighbor (fs, a, b, c, rev)
+        t, fs = or_opt_city_move(d, t, fs, N[0][1], N[0][2], N[0][3], N[0][4])
+    return t, fs
+
+
+class Tour(array):
+    """"Closed tour s[0..n] (s[n] == s[0]) stored in an array('i') along with its inverse index pos[city] = index
+    Moves are applied in place; a 2-opt reversal reverses the shorter side of the cycle (at most n/2 nodes),
+    which gives the same tour traversed in the opposite direction when the complement is reversed"""
+
+    SHORT = 16  # segments up to this size are updated by plain Python loops (cheaper than NumPy calls)
+
+    def __new__(cls, s):
+        self = super().__new__(cls, "i", s)
+        n = len(self) - 1
+        self.pos = array("i", bytes(4 * n))
+        # NumPy views sharing the memory of the tour and of the positions (for bulk updates)
+        self.t_view = np.frombuffer(self, dtype=np.intc)
+        self.pos_view = np.frombuffer(self.pos, dtype=np.intc)
+        self.pos_view[self.t_view[:n]] = np.arange(n, dtype=np.intc)
+        return self
+
+    def __reduce__(self):
+        return Tour, (self.tolist(),)
+
+    def copy(self):
+        """"Copy of the tour (positions included)"""
+        return Tour(self)
+
+    def flip(self, i, j):
+        """"Reverse route segment [i...j] in place, or the rest of the cycle [j+1...i-1] if it is shorter"""
+        n = len(self) - 1
+        m = j - i + 1
+        if 2 * m > n:
+            i, j, m = (j + 1) % n, (i - 1) % n, n - m
+        if m <= self.SHORT:
+            pos = self.pos
+            for _ in range(m // 2):
+                a, b = self[i], self[j]
+                self[i] = b
+                pos[b] = i
+                self[j] = a
+                pos[a] = j
+                i = i + 1 if i + 1 < n else 0
+                j = j - 1 if j > 0 else n - 1
+        elif i <= j:
+            seg = self.t_view[j:i - 1 if i else None:-1].copy()
+            self.t_view[i:j + 1] = seg
+            self.pos_view[seg] = np.arange(i, j + 1, dtype=np.intc)
+        else:  # the segment wraps around index 0
+            idx = np.arange(i, i + m) % n
+            seg = self.t_view[idx[::-1]]
+            self.t_view[idx] = seg
+            self.pos_view[seg] = idx
+        self[n] = self[0]
+
+    def update_pos(self, i, j):
+        """"Refresh the positions of the cities at indexes [i...j]"""
+        if j - i < self.SHORT:
+            pos = self.pos
+            for idx in range(i, j + 1):
+                pos[self[idx]] = idx
+        else:
+            self.pos_view[self.t_view[i:j + 1]] = np.arange(i, j + 1, dtype=np.intc)
+
+    def next(self, c):
+        """"City following city c in the tour"""
+        return self[self.pos[c] + 1]
+
+    def prev(self, c):
+        """"City preceding city c in the tour"""
+        p = self.pos[c]
+        return self[p - 1] if p else self[len(self) - 2]
+
+    def between(self, a, b, c):
+        """"True if city b lies on the path going forward from city a to city c"""
+        pos = self.pos
+        pa, pb, pc = pos[a], pos[b], pos[c]
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    def sequence(self):
+        """"Closed tour as a list of cities"""
+        return self.tolist()
+
+    def reverse_path(self, a, b):
+        """"Reverse the path going forward from city a to city b (or the rest of the cycle)"""
+        i, j = self.pos[a], self.pos[b]
+        if i <= j:
+            self.flip(i, j)
+        elif j + 1 < i:
+            self.flip(j + 1, i - 1)
+
+
+class TwoLevelList:
+    """"Two-level doubly-linked list tour (Fredman et al., 1995) for O(sqrt(n)) reversals on large instances
+    Cities are split into about sqrt(n) segments; each segment is a linked list of cities numbered by id[] and has a
+    reversal bit, and the segments themselves form a doubly-linked cycle ordered by rank[]. A path reversal splits at
+    most two segments and then just flips the reversal bits of whole segments (or reverses inside a single segment)"""
+
+    def __init__(self, s, group=None):
+        n = len(s) - 1
+        self.n = n
+        # cities per segment (moving cities between segments costs more than flipping segments, hence sqrt(n)/2)
+        self.group = group or max(1, int(math.sqrt(n) / 2))
+        self.max_size = 4 * self.group  # segments growing beyond this size trigger a rebuild
+        self.build(s[:n])
+
+    def build(self, order):
+        """"(Re)build balanced segments from the cities in tour order"""
+        n, g = self.n, self.group
+        self.seg = [0] * n   # segment of each city
+        self.id = [0] * n    # sequence number of each city inside its segment
+        self.nxt = [-1] * n  # links inside a segment (regardless of its reversal bit; -1 at both ends)
+        self.prv = [-1] * n
+        self.head, self.tail = [], []
+        for p, k in enumerate(range(0, n, g)):
+            cities = order[k:k + g]
+            for r, c in enumerate(cities):
+                self.seg[c] = p
+                self.id[c] = r
+                if r:
+                    self.prv[c] = cities[r - 1]
+                    self.nxt[cities[r - 1]] = c
+            self.head.append(cities[0])
+            self.tail.append(cities[-1])
+        m = len(self.head)
+        self.rev = [False] * m
+        self.rank = list(range(m))
+        self.snext = [(p + 1) % m for p in range(m)]
+        self.sprev = [(p - 1) % m for p in range(m)]
+
+    def __reduce__(self):
+        return TwoLevelList, (self.sequence(), self.group)
+
+    def copy(self):
+        """"Copy of the tour"""
+        t = TwoLevelList.__new__(TwoLevelList)
+        t.n, t.group, t.max_size = self.n, self.group, self.max_size
+        for attr in ("seg", "id", "nxt", "prv", "head", "tail", "rev", "rank", "snext", "sprev"):
+            setattr(t, attr, getattr(self, attr)[:])
+        return t
+
+    def next(self, c):
+        """"City following city c in the tour"""
+        p = self.seg[c]
+        if self.rev[p]:
+            if c != self.head[p]:
+                return self.prv[c]
+        elif c != self.tail[p]:
+            return self.nxt[c]
+        q = self.snext[p]
+        return self.tail[q] if self.rev[q] else self.head[q]
+
+    def prev(self, c):
+        """"City preceding city c in the tour"""
+        p = self.seg[c]
+        if self.rev[p]:
+            if c != self.tail[p]:
+                return self.nxt[c]
+        elif c != self.head[p]:
+            return self.prv[c]
+        q = self.sprev[p]
+        return self.head[q] if self.rev[q] else self.tail[q]
+
+    def offset(self, c):
+        """"Number of cities preceding city c inside its segment"""
+        p = self.seg[c]
+        return self.id[self.tail[p]] - self.id[c] if self.rev[p] else self.id[c] - self.id[self.head[p]]
+
+    def size(self, p):
+        """"Number of cities of segment p"""
+        return self.id[self.tail[p]] - self.id[self.head[p]] + 1
+
+    def between(self, a, b, c):
+        """"True if city b lies on the path going forward from city a to city c"""
+        n, seg, rank = self.n, self.seg, self.rank
+        ka = rank[seg[a]] * n + self.offset(a)
+        kb = rank[seg[b]] * n + self.offset(b)
+        kc = rank[seg[c]] * n + self.offset(c)
+        if ka <= kc:
+            return ka <= kb <= kc
+        return kb >= ka or kb <= kc
+
+    def sequence(self):
+        """"Closed tour as a list of cities (starting at the first city of the first ranked segment)"""
+        s = []
+        p = self.rank.index(0)
+        for _ in range(len(self.head)):
+            c, last = (self.tail[p], self.head[p]) if self.rev[p] else (self.head[p], self.tail[p])
+            link = self.prv if self.rev[p] else self.nxt
+            s.append(c)
+            while c != last:
+                c = link[c]
+                s.append(c)
+            p = self.snext[p]
+        s.append(s[0])
+        return s
+
+    def reverse_path(self, a, b):
+        """"Reverse the path going forward from city a to city b (or the rest of the cycle)"""
+        if a == b or self.next(b) == a:
+            return
+        if self.seg[a] == self.seg[b]:
+            if self.offset(a) <= self.offset(b):
+                self.reverse_inside(a, b)
+            else:  # the path wraps around the whole tour: reverse the rest of the segment instead
+                self.reverse_inside(self.next(b), self.prev(a))
+            return
+        # make a the first city of its segment and b the last one of its segment
+        p = self.seg[a]
+        k = self.offset(a)
+        if k:
+            if 2 * k <= self.size(p):
+                self.move_head_to_prev(p, a)
+            else:
+                self.move_tail_to_next(p, a)
+            if self.seg[a] == self.seg[b]:
+                return self.reverse_path(a, b)
+        p = self.seg[b]
+        k = self.size(p) - self.offset(b) - 1
+        if k:
+            c = self.next(b)
+            if 2 * k <= self.size(p) and self.snext[p] != self.seg[a]:
+                self.move_tail_to_next(p, c)
+            else:
+                self.move_head_to_prev(p, c)
+        self.reverse_segments(self.seg[a], self.seg[b])
+        if max(self.size(self.sprev[self.seg[a]]), self.size(self.snext[self.seg[b]]),
+               self.size(self.seg[a]), self.size(self.seg[b])) > self.max_size:
+            self.build(self.sequence()[:-1])
+
+    def reverse_inside(self, a, b):
+        """"Reverse the path from city a to city b lying inside a single segment (O(segment size))"""
+        p = self.seg[a]
+        if self.rev[p]:
+            a, b = b, a
+        nxt, prv, ids = self.nxt, self.prv, self.id
+        path = [a]
+        while path[-1] != b:
+            path.append(nxt[path[-1]])
+        before, after = prv[a], nxt[b]
+        first_id = ids[a]
+        path.reverse()
+        for r, c in enumerate(path):
+            ids[c] = first_id + r
+            prv[c] = path[r - 1] if r else before
+            nxt[c] = path[r + 1] if r + 1 < len(path) else after
+        if before == -1:
+            self.head[p] = path[0]
+        else:
+            nxt[before] = path[0]
+        if after == -1:
+            self.tail[p] = path[-1]
+        else:
+            prv[after] = path[-1]
+
+    def reverse_segments(self, p, q):
+        """"Reverse the run of whole segments going forward from segment p to segment q (or the rest of the cycle)"""
+        m = len(self.head)
+        rank, snext, sprev, rev = self.rank, self.snext, self.sprev, self.rev
+        if 2 * ((rank[q] - rank[p]) % m + 1) > m:
+            p, q = snext[q], sprev[p]
+        before, after, r = sprev[p], snext[q], rank[p]
+        run = [p]
+        while run[-1] != q:
+            run.append(snext[run[-1]])
+        for x in run:
+            snext[x], sprev[x] = sprev[x], snext[x]
+            rev[x] = not rev[x]
+        for k, x in enumerate(reversed(run)):
+            rank[x] = (r + k) % m
+        snext[before], sprev[q] = q, before
+        snext[p], sprev[after] = after, p
+
+    def move_head_to_prev(self, p, c):
+        """"Move the cities of segment p preceding city c to the end of the previous segment"""
+        q = self.sprev[p]
+        link = self.prv if self.rev[p] else self.nxt
+        x = self.tail[p] if self.rev[p] else self.head[p]
+        while x != c:
+            y = link[x]
+            self.append(q, x)
+            x = y
+        if self.rev[p]:
+            self.tail[p] = c
+            self.nxt[c] = -1
+        else:
+            self.head[p] = c
+            self.prv[c] = -1
+
+    def move_tail_to_next(self, p, c):
+        """"Move city c and the cities of segment p following it to the start of the next segment"""
+        q = self.snext[p]
+        link = self.nxt if self.rev[p] else self.prv
+        x = self.head[p] if self.rev[p] else self.tail[p]
+        stop = link[c]
+        while x != stop:
+            y = link[x]
+            self.prepend(q, x)
+            x = y
+        if self.rev[p]:
+            self.head[p] = stop
+            self.prv[stop] = -1
+        else:
+            self.tail[p] = stop
+            self.nxt[stop] = -1
+
+    def append(self, q, x):
+        """"Put city x after the last city of segment q"""
+        self.seg[x] = q
+        if self.rev[q]:
+            h = self.head[q]
+            self.prv[h], self.nxt[x], self.prv[x], self.id[x] = x, h, -1, self.id[h] - 1
+            self.head[q] = x
+        else:
+            t = self.tail[q]
+            self.nxt[t], self.prv[x], self.nxt[x], self.id[x] = x, t, -1, self.id[t] + 1
+            self.tail[q] = x
+
+    def prepend(self, q, x):
+        """"Put city x before the first city of segment q"""
+        self.seg[x] = q
+        if self.rev[q]:
+            t = self.tail[q]
+            self.nxt[t], self.prv[x], self.nxt[x], self.id[x] = x, t, -1, self.id[t] + 1
+            self.tail[q] = x
+        else:
+            h = self.head[q]
+            self.prv[h], self.nxt[x], self.prv[x], self.id[x] = x, h, -1, self.id[h] - 1
+            self.head[q] = x
+
+
+def reverse(s, i, j):
+    """"Reverse route segment [i...j] in place (a Tour may reverse the rest of the cycle instead)"""
+    if isinstance(s, Tour):
+        s.flip(i, j)
+    else:
+        s[i:j + 1] = s[i:j + 1][::-1]
+
+
+def update_positions(s, i, j):
+    """"Keep the positions of a Tour up to date after the nodes at indexes [i...j] were rearranged"""
+    if isinstance(s, Tour):
+        s.update_pos(i, j)
+
+
+def positions(s):
+    """"Position array of a closed tour s: pos[s[i]] = i (O(1) lookup of the index of a city)"""
+    if isinstance(s, Tour):
+        return s.pos
+    pos = [0] * (len(s) - 1)
+    for i in range(len(s) - 1):
+        pos[s[i]] = i
+    return pos
+
+
+def new_tour(s, tour_repr="ARRAY"):
+    """"Tour object of the given representation (ARRAY: Tour, TWOLEVEL: TwoLevelList) from a closed tour s"""
+    if tour_repr == "TWOLEVEL":
+        return TwoLevelList(s)
+    return Tour(s)
+
+
+def tour_list(s):
+    """"Closed tour s[0..n] of any tour representation as a list (index-based code, outputs and plots need it)"""
+    if isinstance(s, (Tour, TwoLevelList)):
+        return s.sequence()
+    return s
+
+
 def full_eval(d, s):
     """Full objective function evaluation (please avoid it!)"""
     fs = 0
@@ -20,7 +20,7 @@
 
 :: Please change the EXE and FIXED_PARAMS to the correct ones
 SET "exe=python ../main.py"
-SET "fixed_params=-algorithm ILS"
+SET "fixed_params=-algorithm ILS -cache_dir ../cache"
 
 FOR /f "tokens=1-4*" %%a IN ("%*") DO (
 	SET candidate=%%a
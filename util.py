@@ -1,36 +1,137 @@
+import os
+import hashlib
+import tempfile
 import matplotlib.pyplot as plt
 import numpy as np
 from bokeh.plotting import figure, show, save, output_file
+import distance
 
 
-def read_tsp(file_path):
+CACHE_VERSION = 1  # bump it whenever the layout of cached files changes
+SECTIONS = ("NODE_COORD_SECTION", "DEPOT_SECTION", "DEMAND_SECTION", "EDGE_DATA_SECTION", "FIXED_EDGES_SECTION",
+            "DISPLAY_DATA_SECTION", "TOUR_SECTION", "EDGE_WEIGHT_SECTION")
+
+
+def read_tsp(file_path, dtype="float64", max_matrix_mb=1024, cache_mb=256, cache_dir=None):
     """"Read a TSP instance in TSPLIB95 format
-    http://elib.zib.de/pub/mp-testdata/tsp/tsplib/tsp/index.html"""
-    file = open(file_path, "r")
-    coord = []
-    # find coordinates section
-    for line in file:
-        if line.find("NODE_COORD_SECTION") != -1:
-            break
-    # read coordinates until EOF
-    for line in file:
-        if line.find("EOF") != -1:
-            break
-        line = line.strip().split(" ")
-        i = int(line[0])
-        x = float(line[1])
-        y = float(line[2])
-        coord.append((i, x, y))
-    n = len(coord)
-    # calculate Euclidean Distances
-    d = [[0 for _ in range(n)] for _ in range(n)]
-    for (i, xi, yi) in coord:
-        for (j, xj, yj) in coord:
-            if i != j:
-                d[i - 1][j - 1] = ((xi - xj) ** 2 + (yi - yj) ** 2) ** (1 / 2)
+    http://elib.zib.de/pub/mp-testdata/tsp/tsplib/tsp/index.html
+    Distances follow the EDGE_WEIGHT_TYPE of the instance (EUC_2D, CEIL_2D, ATT, GEO, MAN_2D, MAX_2D or EXPLICIT).
+    The distance matrix is a distance.Matrix backed by a single NumPy array of the given dtype,
+    or a lazy distance.Oracle (row cache of cache_mb MB) when the matrix would exceed max_matrix_mb.
+    If cache_dir is given, coordinates and distance matrix are stored there as .npy files keyed by the
+    instance file hash and later loads memory-map them instead of parsing the instance again"""
+    header = read_header(file_path)
+    metric = header.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+    edge_weight_format = header.get("EDGE_WEIGHT_FORMAT", "FUNCTION")
+    dtype = np.dtype(dtype)
+    ixy = d = None
+    if cache_dir is not None:
+        key = cache_key(file_path, metric if metric != "EXPLICIT" else f'{metric}_{edge_weight_format}', dtype)
+        coord_file = os.path.join(cache_dir, key + ".coord.npy")
+        dist_file = os.path.join(cache_dir, key + ".dist.npy")
+        if os.path.exists(coord_file):
+            ixy = np.load(coord_file, mmap_mode="r")
+            if os.path.exists(dist_file):
+                d = distance.Matrix(np.load(dist_file, mmap_mode="r"))
+    if ixy is None or (d is None and metric == "EXPLICIT"):
+        header, sections = parse_tsplib(file_path)
+        # cities are plotted with display coordinates when there are no node coordinates
+        ixy = sections.get("NODE_COORD_SECTION", sections.get("DISPLAY_DATA_SECTION", np.empty(0)))
+        ixy = ixy.reshape(-1, 3)
+        if cache_dir is not None:
+            save_cache(coord_file, ixy)
+    coord = list(zip(ixy[:, 0].astype(int).tolist(), ixy[:, 1].tolist(), ixy[:, 2].tolist()))
+    xy = np.asarray(ixy[:, 1:])
+    if d is None:
+        if metric == "EXPLICIT":
+            d = distance.explicit_matrix(sections["EDGE_WEIGHT_SECTION"], int(header["DIMENSION"]),
+                                         edge_weight_format, dtype)
+        elif distance.matrix_mb(len(xy), dtype) > max_matrix_mb:
+            # distances on demand as the full matrix does not fit the memory budget
+            d = distance.oracle(xy, metric, dtype, cache_mb)
+        else:
+            d = distance.matrix(xy, metric, dtype)
+        if cache_dir is not None and isinstance(d, distance.Matrix):
+            save_cache(dist_file, d.array)
+            d = distance.Matrix(np.load(dist_file, mmap_mode="r"))
     return d, coord
 
 
+def read_header(file_path):
+    """"Read the specification part of a TSPLIB95 file (KEY : VALUE lines before the first data section)"""
+    header = {}
+    with open(file_path, "r") as file:
+        for line in file:
+            key, sep, value = line.partition(":")
+            key = key.strip()
+            if key in SECTIONS or key == "EOF":
+                break
+            if sep:
+                header[key] = value.strip()
+    return header
+
+
+def parse_tsplib(file_path):
+    """"Streaming TSPLIB95 tokenizer: returns the header and the values of each data section as a flat array
+    Tokens are split on any whitespace, so padded columns and values spread over several lines are fine"""
+    header = {}
+    sections = {}
+    section = None
+    tokens = []
+    with open(file_path, "r") as file:
+        for line in file:
+            words = line.split()
+            if not words:
+                continue
+            if words[0][0].isalpha():  # keyword: close current section
+                if section is not None:
+                    sections[section] = np.array(tokens, dtype=np.float64)
+                    section = None
+                    tokens = []
+                key, sep, value = line.partition(":")
+                key = key.strip()
+                if key == "EOF":
+                    break
+                if key in SECTIONS:
+                    section = key
+                    if key == "NODE_COORD_SECTION" and header.get("NODE_COORD_TYPE", "TWOD_COORDS") != "TWOD_COORDS":
+                        raise ValueError(f'Unsupported NODE_COORD_TYPE {header["NODE_COORD_TYPE"]}')
+                elif sep:
+                    header[key] = value.strip()
+            elif section is not None:
+                tokens.extend(words)
+    if section is not None:
+        sections[section] = np.array(tokens, dtype=np.float64)
+    return header, sections
+
+
+def cache_key(file_path, metric, dtype):
+    """"Cache entry name: hash of the instance file content, distance metric and matrix dtype"""
+    h = hashlib.sha1()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            h.update(chunk)
+    return f'{h.hexdigest()}-{metric}-{np.dtype(dtype).name}-v{CACHE_VERSION}'
+
+
+def save_cache(file_name, array):
+    """"Write an array to the cache atomically (concurrent runs may share the same cache directory)"""
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file_name) or ".", suffix=".tmp")
+    with os.fdopen(fd, "wb") as file:
+        np.save(file, array)
+    os.replace(tmp, file_name)
+
+
+def clear_cache(cache_dir):
+    """"Remove every cached instance file from cache_dir"""
+    if cache_dir is None or not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npy") or name.endswith(".tmp"):
+            os.remove(os.path.join(cache_dir, name))
+
+
 def plot_chart(chart_data, file, title, ub=None):
     fig, ax = plt.subplots()
     chart_data = np.array(chart_data)
@@ -50,8 +151,7 @@ def plot_overall_chart(chart_data, methods, file, title, ub=None):
     fig, ax = plt.subplots()
     styles = ['o-b', '^--g', ',-.r', 'v:c', 's-m', 'vk:', 'v-g', 'o-r', '^--y', ',-.b']
     for i in range(len(chart_data)):
-        preprocess_data(chart_data[i])
-        data = np.array(chart_data[i])
+        data = preprocess_data(chart_data[i])
         plt.plot(data[:, 0], data[:, 2], styles[i])
     if ub is not None:  # print optimal solution cost base line
         plt.axhline(y=ub, color='k', linestyle='--')
@@ -66,13 +166,10 @@ def plot_overall_chart(chart_data, methods, file, title, ub=None):
 
 
 def preprocess_data(data):
-    """"Remove duplicated best solution records"""
-    i  = 0
-    while i + 1 < len(data):
-        if data[i][2] == data[i+1][2]:
-            data.pop(i+1)
-        else:
-            i += 1
+    """"Chart data (list of records or trace) as an array without the records repeating the best solution cost of
+    the previous one"""
+    data = np.asarray(data, dtype=np.float64).reshape(-1, 3)
+    return data[np.r_[True, data[1:, 2] != data[:-1, 2]]]
 
 
 def plot_sol(s, coord, file_name, title="", path=False):
@@ -90,4 +187,4 @@ def plot_sol(s, coord, file_name, title="", path=False):
     output_file(file_name)
     save(fig)
     #export_png(fig, filename=file_name)
-    # fig.outpsavefig(file_name)
\ No newline at end of file
+    # fig.outpsavefig(file_name)